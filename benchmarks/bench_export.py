@@ -0,0 +1,57 @@
+# Compares one export_cases workbook with export_sharded across worker processes, e.g.
+#     python benchmarks/bench_export.py --cases 20000 --shards 4
+# Every case is parsed from the same recorded extract with its own reference, so the workbooks
+# hold realistic rows; the output goes to a temporary directory.
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from helpers.excel_out import cached_template, export_cases
+from helpers.ops_stand_in import RECORDED_EXTRACTS_DIR
+from helpers.party_registry import PartyRegistry
+from helpers.register_parser_functions import extract_patent, split_register_document
+from helpers.sharded_export import export_sharded
+
+
+def make_patents(content: bytes, cases: int) -> list:
+    registry = PartyRegistry()
+    biblio = split_register_document(json.loads(content)).biblio
+    patents = []
+    for n in range(cases):
+        patent = extract_patent(biblio, registry=registry)
+        patent.ref = f"ref{n:06}"
+        patents.append(patent)
+    return patents
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "extract",
+        nargs="?",
+        default=str(RECORDED_EXTRACTS_DIR / "sample_extract.json"),
+    )
+    parser.add_argument("--cases", type=int, default=10000)
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+
+    patents = make_patents(Path(args.extract).read_bytes(), args.cases)
+    cached_template()  # parse the template before timing
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        export_cases(patents, Path(output_dir) / "single.xlsx")
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        export_sharded(patents, Path(output_dir) / "sharded.xlsx", shards=args.shards)
+        sharded = time.perf_counter() - start
+    print(f"one workbook:      {single:6.2f} s")
+    print(f"{args.shards} shards:          {sharded:6.2f} s ({single / sharded:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
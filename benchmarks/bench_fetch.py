@@ -0,0 +1,68 @@
+# Measures register fetch throughput against the local OPS stand-in, e.g.
+#     python benchmarks/bench_fetch.py --cases 10000 --concurrency 16 --latency 0.05
+# By default the stand-in runs in this process and competes with the fetcher for the GIL.
+# For cleaner numbers start it separately and pass its address:
+#     PYTHONPATH=src python -m helpers.ops_stand_in --serve-any-number --latency 0.05
+#     python benchmarks/bench_fetch.py --base-url http://127.0.0.1:8080
+import contextlib
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from helpers import register_access_download
+from helpers.bulk_fetch import fetch_extracts_sync
+from helpers.ops_stand_in import OPSStandIn, StandInConfig, default_service_lights
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--latency-jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--system-state", default="idle")
+    parser.add_argument("--base-url", help="address of a stand-in already running")
+    # Rate the stand-in advertises for register retrieval; OPS itself allows far less,
+    # so the default measures the fetcher rather than the throttle
+    parser.add_argument("--requests-per-minute", type=int, default=600000)
+    args = parser.parse_args()
+
+    service_lights = default_service_lights()
+    service_lights["other"] = ("green", args.requests_per_minute)
+    config = StandInConfig(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        system_state=args.system_state,
+        service_lights=service_lights,
+        serve_any_number=True,
+        seed=0,
+    )
+    # Distinct publication numbers, all answered with a recorded extract
+    numbers = [f"EP{4000000 + i}" for i in range(args.cases)]
+    with contextlib.ExitStack() as stack:
+        stand_in = None
+        base_url = args.base_url
+        if base_url is None:
+            stand_in = stack.enter_context(OPSStandIn(config=config))
+            base_url = stand_in.base_url
+        register_access_download.set_ops_base_url(base_url)
+        start = time.perf_counter()
+        results = fetch_extracts_sync(numbers, concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+        served = f", {stand_in.bytes_served / 1e6:.1f} MB served" if stand_in else ""
+    invalid = sum("invalid_number" in extract for _, extract in results)
+    print(
+        f"{len(results)} cases in {elapsed:.2f}s ({len(results) / elapsed:.0f} cases/s), "
+        f"concurrency {args.concurrency}, {invalid} invalid{served}"
+    )
+
+
+if __name__ == "__main__":
+    main()
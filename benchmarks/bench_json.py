@@ -0,0 +1,39 @@
+# Compares the available JSON decoders on the recorded extracts in output_files/, decoding
+# from bytes as retrieve_one_extract does and, for reference, via an intermediate str as the
+# old code did, e.g.
+#     python benchmarks/bench_json.py --repeat 200
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from helpers.json_decoding import DECODERS, encode_json
+from helpers.ops_stand_in import RECORDED_EXTRACTS_DIR, load_recorded_extract
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("extracts", nargs="*")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    paths = args.extracts or sorted(RECORDED_EXTRACTS_DIR.glob("*.json"))
+    for path in paths:
+        # re-encoded as UTF-8, which is what OPS sends; some recordings are cp1252 on disk
+        content = encode_json(load_recorded_extract(path))
+        print(f"{Path(path).name}: {len(content) / 1024:.0f} kB")
+        for name, decode in DECODERS.items():
+            cases = {
+                "bytes": lambda: decode(content),
+                "via str": lambda: decode(str(content, encoding="utf-8")),
+            }
+            for path_name, function in cases.items():
+                seconds = min(timeit.repeat(function, number=args.repeat, repeat=3))
+                per_call = seconds / args.repeat * 1e3
+                print(f"    {name:<8}{path_name:<9}{per_call:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Measures the memory retained per parsed case, e.g.
+#     python benchmarks/bench_memory.py --cases 5000
+# Each case is decoded from the raw extract afresh, as it would be when downloaded, then parsed
+# with its own PartyRegistry so parties are not shared between cases. The "before" figure copies
+# every parsed case into plain __dict__ dataclasses with unshared strings and dates, which is
+# how cases were held before Patent, Party and Priority became slotted and interned.
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from dataclasses import fields, make_dataclass
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from helpers.ops_stand_in import RECORDED_EXTRACTS_DIR
+from helpers.party_registry import PartyRegistry
+from helpers.register_parser_functions import (
+    Party,
+    Patent,
+    Priority,
+    extract_patent,
+    split_register_document,
+)
+
+
+def plain_class(compact_class):
+    return make_dataclass(
+        compact_class.__name__,
+        [(field.name, field.type) for field in fields(compact_class)],
+    )
+
+
+PLAIN_CLASSES = {cls: plain_class(cls) for cls in (Patent, Party, Priority)}
+
+
+def unshared(value):
+    if isinstance(value, str):
+        return value.encode("utf-8").decode("utf-8")  # a new, equal string
+    if isinstance(value, datetime):
+        return value.replace()
+    if isinstance(value, list):
+        return [unshared(item) for item in value]
+    if type(value) in PLAIN_CLASSES:
+        return PLAIN_CLASSES[type(value)](
+            **{
+                field.name: unshared(getattr(value, field.name))
+                for field in fields(value)
+            }
+        )
+    return value
+
+
+def parse_cases(content: bytes, cases: int, compact: bool) -> list:
+    patents = []
+    for _ in range(cases):
+        biblio = split_register_document(json.loads(content)).biblio
+        patent = extract_patent(biblio, registry=PartyRegistry())
+        patents.append(patent if compact else unshared(patent))
+    return patents
+
+
+def bytes_per_case(content: bytes, cases: int, compact: bool) -> float:
+    gc.collect()
+    tracemalloc.start()
+    patents = parse_cases(content, cases, compact)
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del patents
+    return retained / cases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "extract",
+        nargs="?",
+        default=str(RECORDED_EXTRACTS_DIR / "sample_extract.json"),
+    )
+    parser.add_argument("--cases", type=int, default=2000)
+    args = parser.parse_args()
+
+    content = Path(args.extract).read_bytes()
+    before = bytes_per_case(content, args.cases, compact=False)
+    after = bytes_per_case(content, args.cases, compact=True)
+    print(f"before: {before:10.0f} bytes per case")
+    print(f"after:  {after:10.0f} bytes per case ({after / before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Compares the hand-written Party fillers with the same fields read through compile_fields, and
+# measures whole-case parsing with extract_patent, on a recorded extract, e.g.
+#     python benchmarks/bench_parse.py --repeat 20000
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from helpers.field_specs import compile_fields
+from helpers.ops_stand_in import load_recorded_extract
+from helpers.register_parser_functions import (
+    APPLICANT_FIELDS,
+    INVENTOR_FIELDS,
+    LazyPatent,
+    Party,
+    extract_patent,
+    fill_applicant,
+    fill_inventor,
+    latest_parties,
+    split_register_document,
+)
+
+
+def per_call(function, repeat: int) -> float:
+    return min(timeit.repeat(function, number=repeat, repeat=5)) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "extract",
+        nargs="?",
+        default=str(
+            Path(__file__).parents[1] / "output_files/test_register_extract.json"
+        ),
+    )
+    parser.add_argument("--repeat", type=int, default=10000)
+    args = parser.parse_args()
+
+    biblio = split_register_document(load_recorded_extract(args.extract)).biblio
+    parties = biblio["reg:parties"]
+    applicant = latest_parties(parties["reg:applicants"], "reg:applicant")[0]
+    inventor = latest_parties(parties["reg:inventors"], "reg:inventor")[0]
+    spec_applicant = compile_fields(APPLICANT_FIELDS)
+    spec_inventor = compile_fields(INVENTOR_FIELDS)
+    cases = [
+        ("applicant, hand-written", lambda: fill_applicant(applicant, Party())),
+        ("applicant, compiled", lambda: spec_applicant(applicant, Party())),
+        ("inventor, hand-written", lambda: fill_inventor(inventor, Party())),
+        ("inventor, compiled", lambda: spec_inventor(inventor, Party())),
+        ("whole case, extract_patent", lambda: extract_patent(biblio)),
+        ("grant date only, LazyPatent", lambda: LazyPatent(biblio).grant_date),
+    ]
+    for name, function in cases:
+        print(f"{name:<30}{per_call(function, args.repeat):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+from collections.abc import Iterable
+from dataclasses import dataclass, fields
+
+import pandas as pd
+
+from helpers.field_specs import MISSING, compile_path
+from helpers.party_registry import PartyRegistry
+from helpers.register_parser_functions import (
+    Party,
+    as_list,
+    get_register_document,
+    latest_parties,
+    scan_application_reference,
+    scan_designation_of_states,
+    scan_invention_title,
+    scan_parties,
+    scan_publication_reference,
+)
+
+CASE_DATE_COLUMNS = [
+    "filing_date",
+    "ep_publication_date",
+    "wo_publication_date",
+    "grant_date",
+]
+PARTY_COLUMNS = [field.name for field in fields(Party)]
+# Raw priority values, one compiled path per column; dates are converted later, per column
+PRIORITY_PATHS = {
+    "country": compile_path(("reg:country", "$")),
+    "date": compile_path(("reg:date", "$")),
+    "number": compile_path(("reg:doc-number", "$")),
+}
+
+
+@dataclass
+class PortfolioFrames:
+    """
+    Many parsed cases in columnar form. cases has one row per case, indexed by EP application
+    number; the other frames have one row per priority, designated state or party on a case and
+    refer back to it through their ep_application_number column.
+    """
+
+    cases: pd.DataFrame
+    priorities: pd.DataFrame
+    designated_states: pd.DataFrame
+    parties: pd.DataFrame
+    invalid_numbers: list[str]
+
+
+def register_dates(raw_dates: list[str]) -> pd.Series:
+    """
+    Converts a column of register dates such as "20180806" to datetime64 in one vectorised call;
+    empty or malformed values become NaT
+    """
+    return pd.to_datetime(
+        pd.Series(raw_dates, dtype="object"), format="%Y%m%d", errors="coerce"
+    )
+
+
+def parse_extracts_to_frames(
+    extracts: Iterable[dict], registry: PartyRegistry | None = None
+) -> PortfolioFrames:
+    """
+    Parses register extracts, as returned by retrieve_one_extract or a register search page,
+    straight into columns. Dates are kept as raw strings while scanning and converted a whole
+    column at a time. Parties are deduplicated in registry, a new one for this batch by default,
+    so the same party has the same unique_id on every case.
+    """
+    if registry is None:
+        registry = PartyRegistry()
+    cases = {
+        column: []
+        for column in [
+            "ep_application_number",
+            "wo_application_number",
+            "title",
+            "ep_publication_number",
+            "wo_publication_number",
+            "is_granted",
+            *CASE_DATE_COLUMNS,
+        ]
+    }
+    priorities = {
+        "ep_application_number": [],
+        **{column: [] for column in PRIORITY_PATHS},
+    }
+    designated_states = {"ep_application_number": [], "designated_country": []}
+    parties = {
+        "ep_application_number": [],
+        "role": [],
+        **{column: [] for column in PARTY_COLUMNS},
+    }
+    invalid_numbers = []
+
+    for extract in extracts:
+        if "invalid_number" in extract:
+            invalid_numbers.append(extract["invalid_number"])
+            continue
+        for document in as_list(get_register_document(extract)):
+            biblio = document["reg:bibliographic-data"]
+            application_numbers, filing_date = scan_application_reference(
+                biblio["reg:application-reference"], convert_date=str
+            )
+            publication_data, grant_date = scan_publication_reference(
+                biblio["reg:publication-reference"], convert_date=str
+            )
+            case = application_numbers["EP"]
+            cases["ep_application_number"].append(case)
+            cases["wo_application_number"].append(application_numbers.get("WO", ""))
+            cases["title"].append(scan_invention_title(biblio["reg:invention-title"]))
+            for country in ("ep", "wo"):
+                publication = publication_data.get(country.upper(), {})
+                cases[f"{country}_publication_number"].append(
+                    publication.get("number", "")
+                )
+                cases[f"{country}_publication_date"].append(publication.get("date", ""))
+            cases["is_granted"].append(grant_date != "")
+            cases["filing_date"].append(filing_date)
+            cases["grant_date"].append(grant_date)
+
+            if "reg:priority-claims" in biblio:
+                for entry in latest_parties(
+                    biblio["reg:priority-claims"], "reg:priority-claim"
+                ):
+                    priorities["ep_application_number"].append(case)
+                    for column, path in PRIORITY_PATHS.items():
+                        value = path(entry)
+                        priorities[column].append("" if value is MISSING else value)
+
+            for country in scan_designation_of_states(
+                biblio.get("reg:designation-of-states", {})
+            ):
+                designated_states["ep_application_number"].append(case)
+                designated_states["designated_country"].append(country)
+
+            applicants, inventors = scan_parties(biblio["reg:parties"], registry)
+            for role, found in (("applicant", applicants), ("inventor", inventors)):
+                for party in found:
+                    parties["ep_application_number"].append(case)
+                    parties["role"].append(role)
+                    for column in PARTY_COLUMNS:
+                        parties[column].append(getattr(party, column))
+
+    cases_frame = pd.DataFrame(cases)
+    for column in CASE_DATE_COLUMNS:
+        cases_frame[column] = register_dates(cases[column])
+    priorities_frame = pd.DataFrame(priorities)
+    priorities_frame["date"] = register_dates(priorities["date"])
+    return PortfolioFrames(
+        cases=cases_frame.set_index("ep_application_number"),
+        priorities=priorities_frame,
+        designated_states=pd.DataFrame(designated_states),
+        parties=pd.DataFrame(parties),
+        invalid_numbers=invalid_numbers,
+    )
@@ -0,0 +1,83 @@
+import asyncio
+from collections.abc import AsyncIterator, Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.coalescing import DEFAULT_MAX_CASES, CoalescingFetcher
+from helpers.register_access_download import (
+    ensure_pool_size,
+    retrieve_one_extract,
+    token_manager,
+)
+
+DEFAULT_CONCURRENCY = 8
+
+
+async def fetch_extracts(
+    numbers: Iterable[str | int],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    constituents: Iterable[str] | None = None,
+    fetcher: CoalescingFetcher | None = None,
+) -> AsyncIterator[tuple[str | int, dict]]:
+    """
+    Fetches the register extract for each number, with at most `concurrency` requests in flight,
+    and yields (input_number, extract) pairs in the order they complete.
+    Invalid numbers are yielded as {"invalid_number": ...}, as returned by retrieve_one_extract.
+    numbers is consumed lazily, so it can be a generator over a large case list.
+    constituents is passed on to retrieve_one_extract, ("biblio",) by default.
+    Lookups go through a CoalescingFetcher, so the same case listed under several numbers
+    is downloaded once; pass one in to share what it has learned between runs. It fetches its
+    own constituents, so a different constituents raises ValueError. The fetcher created here
+    keeps at most DEFAULT_MAX_CASES extracts.
+    """
+    if fetcher is None:
+        fetcher = CoalescingFetcher(
+            retrieve_one_extract, constituents or ("biblio",), DEFAULT_MAX_CASES
+        )
+    elif constituents is not None and tuple(constituents) != fetcher.constituents:
+        raise ValueError(
+            f"fetcher fetches {fetcher.constituents}, not {tuple(constituents)}"
+        )
+    ensure_pool_size(concurrency)
+    await token_manager.get_token_async()  # one token up front, shared by every request
+    loop = asyncio.get_running_loop()
+    pending_numbers = iter(numbers)
+    in_flight = {}
+
+    def start_next(executor: ThreadPoolExecutor) -> None:
+        for number in pending_numbers:
+            future = loop.run_in_executor(executor, fetcher.fetch, number)
+            in_flight[future] = number
+            return
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        for _ in range(concurrency):
+            start_next(executor)
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                number = in_flight.pop(future)
+                start_next(executor)
+                yield number, future.result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        # don't wait on the event loop for requests nobody will read
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_extracts_sync(
+    numbers: Iterable[str | int],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    constituents: Iterable[str] = ("biblio",),
+) -> list[tuple[str | int, dict]]:
+    """
+    Blocking wrapper around fetch_extracts for scripts, returns the pairs in completion order
+    """
+
+    async def collect() -> list[tuple[str | int, dict]]:
+        return [
+            pair async for pair in fetch_extracts(numbers, concurrency, constituents)
+        ]
+
+    return asyncio.run(collect())
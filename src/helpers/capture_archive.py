@@ -0,0 +1,139 @@
+import base64
+import gzip
+import json
+import logging
+import queue
+import threading
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+
+from helpers.json_decoding import decode_json
+
+logger = logging.getLogger(__name__)
+
+
+class CaptureArchive:
+    """
+    Append-only archive of raw OPS responses for later inspection or replay.
+    Every record is written as its own gzip member, so the archive file as a whole still reads
+    as gzipped JSONL, and a sidecar index (<path>.idx) holds one JSON line per record with the
+    number, byte offset and length so any captured document can be read back without a scan.
+    Records are written by a background thread; capture() itself does no disk I/O. Bodies
+    that are not UTF-8 are stored base64 encoded, and a record that cannot be written is
+    logged and skipped without stopping the thread.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self._index = {}  # number -> list of (offset, length), oldest first
+        self._index_lock = threading.Lock()
+        self._load_index()
+        self._queue = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._write_records, daemon=True)
+        self._writer_thread.start()
+
+    def _load_index(self) -> None:
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                self._index.setdefault(entry["number"], []).append(
+                    (entry["offset"], entry["length"])
+                )
+
+    def capture(self, number: str, content: bytes, url: str = "") -> None:
+        """
+        Queues one raw response body for the writer thread
+        """
+        self._queue.put((number, content, url, datetime.now().isoformat()))
+
+    def _write_records(self) -> None:
+        with open(self.path, "ab") as archive, open(
+            self.index_path, "a", encoding="utf-8"
+        ) as index:
+            while True:
+                item = self._queue.get()
+                try:
+                    if item is None:
+                        break
+                    self._write_record(archive, index, *item)
+                except Exception:
+                    logger.exception("Could not capture the response for %s", item[0])
+                finally:
+                    self._queue.task_done()
+
+    def _write_record(
+        self, archive, index, number: str, content: bytes, url: str, captured_at: str
+    ) -> None:
+        record = {"number": number, "url": url, "captured_at": captured_at}
+        try:
+            record["body"] = str(content, encoding="utf-8")
+        except UnicodeDecodeError:
+            record["body"] = base64.b64encode(content).decode("ascii")
+            record["body_encoding"] = "base64"
+        member = gzip.compress(
+            (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        )
+        offset = archive.tell()
+        archive.write(member)
+        archive.flush()
+        index.write(
+            json.dumps({"number": number, "offset": offset, "length": len(member)})
+            + "\n"
+        )
+        index.flush()
+        with self._index_lock:
+            self._index.setdefault(number, []).append((offset, len(member)))
+
+    def flush(self) -> None:
+        """
+        Blocks until every queued record is on disk
+        """
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer_thread.join()
+
+    def numbers(self) -> list[str]:
+        with self._index_lock:
+            return list(self._index)
+
+    def read(self, number: str, which: int = -1) -> dict:
+        """
+        Returns a captured record ({"number", "url", "captured_at", "body"}) for number,
+        by default the most recent capture. Raises KeyError if number was never captured.
+        A body that was not UTF-8 is base64 encoded, with "body_encoding": "base64".
+        """
+        with self._index_lock:
+            offset, length = self._index[number][which]
+        with open(self.path, "rb") as archive:
+            archive.seek(offset)
+            return json.loads(gzip.decompress(archive.read(length)))
+
+    def read_extract(self, number: str, which: int = -1) -> dict:
+        """
+        Returns the captured register extract for number, decoded as retrieve_one_extract would
+        """
+        return decode_json(self.read_body(number, which))
+
+    def read_body(self, number: str, which: int = -1) -> bytes:
+        """
+        Returns a captured response body exactly as it was received
+        """
+        record = self.read(number, which)
+        if record.get("body_encoding") == "base64":
+            return base64.b64decode(record["body"])
+        return record["body"].encode("utf-8")
+
+    def replay(self) -> Iterator[dict]:
+        """
+        Yields every captured record in the order it was written
+        """
+        with gzip.open(self.path, "rt", encoding="utf-8") as archive:
+            for line in archive:
+                yield json.loads(line)
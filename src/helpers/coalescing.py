@@ -0,0 +1,115 @@
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future
+
+from helpers.register_access_download import (
+    number_normalization,
+    retrieve_one_extract,
+)
+from helpers.register_parser_functions import document_numbers, get_register_document
+
+logger = logging.getLogger(__name__)
+DEFAULT_MAX_CASES = 1000  # extracts kept by the fetcher fetch_extracts creates
+
+
+class CoalescingFetcher:
+    """
+    Sits above retrieve_one_extract so that each case is downloaded once, however many ways
+    the input sheets write its number. Concurrent lookups of the same normalized number share
+    one request (single flight). Once a response arrives, the EP application and publication
+    numbers in it are recorded as aliases, so that e.g. EP3661357 after ep18752141 is answered
+    without a network call. Lookups of two different aliases that are both in flight before
+    either answer is known cannot be merged and are fetched separately.
+    max_cases bounds how many extracts are kept, least recently used first out, together with
+    their aliases; None keeps all. Only good extracts are kept: invalid numbers and errors are
+    fetched again on the next lookup, as are extracts whose numbers cannot be read.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[..., dict] | None = None,
+        constituents: Iterable[str] = ("biblio",),
+        max_cases: int | None = None,
+    ):
+        self._fetch = fetch or retrieve_one_extract
+        self.constituents = tuple(constituents)
+        self.max_cases = max_cases
+        self._lock = threading.Lock()
+        self._in_flight = {}  # normalized number -> Future of its extract
+        self._aliases = {}  # normalized number -> canonical key in _extracts
+        self._aliases_of = {}  # canonical key -> normalized numbers aliased to it
+        self._extracts = OrderedDict()  # canonical key -> extract
+        self.network_fetches = 0
+        self.coalesced = 0  # lookups answered from another lookup or an alias
+
+    def fetch(self, number: str | int) -> dict:
+        number_type, normalized_number = number_normalization(number)
+        with self._lock:
+            extract = self._known_extract(normalized_number)
+            if extract is not None:
+                self.coalesced += 1
+                return extract
+            future = self._in_flight.get(normalized_number)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._in_flight[normalized_number] = future
+                self.network_fetches += 1
+            else:
+                self.coalesced += 1
+        if not is_owner:
+            return future.result()
+        try:
+            extract = self._fetch(
+                number_type, normalized_number, constituents=self.constituents
+            )
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[normalized_number]
+            future.set_exception(e)
+            raise
+        try:
+            with self._lock:
+                self._learn(normalized_number, extract)
+        except Exception:  # e.g. a document without reg:country: returned, not kept
+            logger.warning("Could not read the numbers in the extract for %s", number)
+        finally:
+            with self._lock:
+                del self._in_flight[normalized_number]
+            future.set_result(extract)
+        return extract
+
+    def _known_extract(self, normalized_number: str) -> dict | None:
+        canonical = self._aliases.get(normalized_number)
+        if canonical is None or canonical not in self._extracts:
+            return None
+        self._extracts.move_to_end(canonical)
+        return self._extracts[canonical]
+
+    def _learn(self, normalized_number: str, extract: dict) -> None:
+        if "ops:world-patent-data" not in extract:  # invalid number, may be valid later
+            return
+        aliases = {normalized_number} | document_numbers(get_register_document(extract))
+        self._extracts[normalized_number] = extract
+        self._aliases_of[normalized_number] = aliases
+        for alias in aliases:
+            self._aliases[alias] = normalized_number
+        if self.max_cases is not None:
+            while len(self._extracts) > self.max_cases:
+                canonical, _ = self._extracts.popitem(last=False)
+                for alias in self._aliases_of.pop(canonical):
+                    if self._aliases.get(alias) == canonical:
+                        del self._aliases[alias]
+
+    def aliases_of(self, number: str | int) -> set[str]:
+        """
+        Returns every normalized number known to refer to the same case as number
+        """
+        _, normalized_number = number_normalization(number)
+        with self._lock:
+            canonical = self._aliases.get(normalized_number)
+            return {
+                alias for alias, target in self._aliases.items() if target == canonical
+            }
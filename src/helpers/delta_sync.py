@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+
+from helpers import register_access_download
+from helpers.bulk_fetch import DEFAULT_CONCURRENCY, fetch_extracts_sync
+from helpers.extract_cache import cache_key
+from helpers.register_access_download import (
+    SearchTruncatedError,
+    cql_phrase,
+    number_normalization,
+    search_register,
+)
+from helpers.register_parser_functions import as_list
+
+# CQL field searched for each kind of name in the portfolio definition
+SYNC_NAME_FIELDS = {"applicant": "pa", "representative": "re"}
+DEFAULT_WATERMARK_PATH = (
+    Path(__file__).parents[2] / "output_files" / "sync_watermark.json"
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SyncResult:
+    until: date
+    # "pa=NAME" or "re=NAME" -> date searched from, None for a name synced for the first time
+    since: dict[str, date | None] = field(default_factory=dict)
+    # normalized application number -> extract, for every case found changed
+    extracts: dict[str, dict] = field(default_factory=dict)
+    # names whose search matched more cases than OPS serves; their watermarks are left as they were
+    truncated: list[str] = field(default_factory=list)
+
+
+def load_watermarks(path: str | Path) -> dict[str, date]:
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {
+            name: date.fromisoformat(synced) for name, synced in json.load(f).items()
+        }
+
+
+def save_watermarks(path: str | Path, watermarks: dict[str, date]) -> None:
+    """
+    Writes the watermarks through a temporary file, so an interrupted run leaves the old ones
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(
+            {name: synced.isoformat() for name, synced in watermarks.items()},
+            f,
+            indent=4,
+        )
+    os.replace(temporary, path)
+
+
+def changed_cases_query(
+    cql_field: str, name: str, since: date | None, until: date
+) -> str:
+    """
+    Builds e.g. pa="ACME" and pd within "20241001 20241018"; without since, every case of name.
+    name is quoted with cql_phrase, so quotes inside it cannot break the query.
+    """
+    query = f"{cql_field}={cql_phrase(name)}"
+    if since is not None:
+        query += f' and pd within "{since:%Y%m%d} {until:%Y%m%d}"'
+    return query
+
+
+def application_number(document: dict) -> str | None:
+    """
+    Returns the EP application number of a reg:register-document as number_normalization does,
+    e.g. "EP18752141", or None if it has no EP application reference
+    """
+    references = document["reg:bibliographic-data"]["reg:application-reference"]
+    for reference in as_list(references):
+        document_id = reference["reg:document-id"]
+        if document_id["reg:country"]["$"] == "EP":
+            return "EP" + document_id["reg:doc-number"]["$"]
+    return None
+
+
+def search_changed_cases(
+    cql_field: str, name: str, since: date | None, until: date
+) -> tuple[list[dict], bool]:
+    """
+    Returns the register documents found by changed_cases_query and whether that is all of them.
+    A date range matching more cases than OPS serves is split in halves until each part fits;
+    a first sync or a single day that still does not fit gives the cases OPS serves and False.
+    """
+    query = changed_cases_query(cql_field, name, since, until)
+    try:
+        return list(search_register(query, strict=True)), True
+    except SearchTruncatedError as error:
+        if since is None or since >= until:
+            logger.warning("%s, syncing it again next time", error)
+            return list(search_register(query)), False
+    middle = since + timedelta(days=(until - since).days // 2)
+    first, first_complete = search_changed_cases(cql_field, name, since, middle)
+    second, second_complete = search_changed_cases(
+        cql_field, name, middle + timedelta(days=1), until
+    )
+    return first + second, first_complete and second_complete
+
+
+def delta_sync(
+    applicants: Iterable[str] = (),
+    representatives: Iterable[str] = (),
+    watermark_path: str | Path = DEFAULT_WATERMARK_PATH,
+    until: date | None = None,
+    constituents: Iterable[str] = ("biblio",),
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> SyncResult:
+    """
+    Fetches only the cases of the portfolio's applicants and representatives that were published
+    since each name's last sync, then moves the watermarks to until (today by default).
+    Names not in the watermark file yet get all their cases. The register search only indexes
+    publication dates, so changes without a publication are picked up by a full refresh only.
+    A name whose cases could not all be retrieved (see search_changed_cases) keeps its watermark.
+    Stale copies of the changed cases are dropped from the extract cache before fetching.
+    """
+    until = until or date.today()
+    watermarks = load_watermarks(watermark_path)
+    result = SyncResult(until)
+    changed = set()
+    names = [("applicant", name) for name in applicants]
+    names += [("representative", name) for name in representatives]
+    for kind, name in names:
+        name = name.strip()
+        if not name:
+            continue
+        cql_field = SYNC_NAME_FIELDS[kind]
+        watermark_key = f"{cql_field}={name}"
+        since = watermarks.get(watermark_key)
+        result.since[watermark_key] = since
+        documents, complete = search_changed_cases(cql_field, name, since, until)
+        if not complete:
+            result.truncated.append(watermark_key)
+        for document in documents:
+            number = application_number(document)
+            if number is not None:
+                changed.add(number)
+    constituents = tuple(constituents)
+    cache = register_access_download.extract_cache
+    if cache is not None:
+        for number in changed:
+            number_type, number = number_normalization(number)
+            cache.discard(cache_key(number_type, number, ",".join(constituents)))
+    for number, extract in fetch_extracts_sync(
+        sorted(changed), concurrency, constituents
+    ):
+        result.extracts[number] = extract
+    watermarks.update(
+        {key: until for key in result.since if key not in result.truncated}
+    )
+    save_watermarks(watermark_path, watermarks)
+    return result
@@ -1,16 +1,25 @@
+import csv
+from collections.abc import Iterator
 from pathlib import Path
 from openpyxl import Workbook, load_workbook
 
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for Parquet case lists
+    pq = None
 
-def get_excel_file() -> Workbook:
-    print(
-        "The Excel file should contain two columns on the first sheet, with the first column being \n"
-        "a reference (e.g. client ref when creating new cases or Patricia number if cases exist) and \n"
-        "the second column being the application or publication number. A header is expected for each row."
-    )
+CHUNK_SIZE = 10000  # rows read at a time from Parquet
 
-    excel_file = Path(input("Enter Excel file path: "))
-    wb = load_workbook(excel_file)
+
+def get_excel_file(excel_file: str | Path | None = None) -> Workbook:
+    if excel_file is None:
+        print(
+            "The Excel file should contain two columns on the first sheet, with the first column being \n"
+            "a reference (e.g. client ref when creating new cases or Patricia number if cases exist) and \n"
+            "the second column being the application or publication number. A header is expected for each row."
+        )
+        excel_file = input("Enter Excel file path: ")
+    wb = load_workbook(Path(excel_file))
     return wb
 
 
@@ -21,4 +30,58 @@ def extract_excel_data(wb: Workbook) -> list[tuple[str, str]]:
     return list(zip(refs, numbers))
 
 
+def iter_case_list(
+    path: str | Path, chunk_size: int = CHUNK_SIZE
+) -> Iterator[tuple[str, str]]:
+    """
+    Yields (ref, number) from the first two columns of a case list, skipping the header row,
+    as extract_excel_data does but one row at a time, so fetching can start on the first case.
+    Reads .xlsx/.xlsm in openpyxl read-only mode, .csv with the csv module and .parquet
+    chunk_size rows at a time (needs pyarrow). Blank rows are skipped.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix in (".xlsx", ".xlsm"):
+        rows = iter_excel_rows(path)
+    elif suffix == ".csv":
+        rows = iter_csv_rows(path)
+    elif suffix == ".parquet":
+        rows = iter_parquet_rows(path, chunk_size)
+    else:
+        raise ValueError(f"Unsupported case list format: {path.name}")
+    for ref, number in rows:
+        if ref is None and number is None:
+            continue
+        yield str(ref), str(number)
+
+
+def iter_excel_rows(path: Path) -> Iterator[tuple]:
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(min_row=2, max_col=2, values_only=True):
+            yield tuple(row) + (None,) * (2 - len(row))
+    finally:
+        wb.close()  # read-only workbooks keep the file open until closed
+
+
+def iter_csv_rows(path: Path) -> Iterator[tuple]:
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            row = [value or None for value in row[:2]]
+            yield tuple(row) + (None,) * (2 - len(row))
+
+
+def iter_parquet_rows(path: Path, chunk_size: int) -> Iterator[tuple]:
+    if pq is None:
+        raise ImportError(
+            "Reading Parquet case lists needs pyarrow: pip install pyarrow"
+        )
+    parquet_file = pq.ParquetFile(path)
+    columns = parquet_file.schema_arrow.names[:2]
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
 # def create_excel_file(refs: list[str], numbers: list[str]):
@@ -1,25 +1,186 @@
+import csv
+import os
+import threading
+from collections.abc import Iterable
+from copy import copy
+from dataclasses import dataclass, field
 from pathlib import Path
 from datetime import datetime
 from openpyxl import Workbook, load_workbook
-from helpers.register_parser_functions import Patent
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.utils import column_index_from_string
+from helpers.field_specs import parse_date
+from helpers.register_parser_functions import Party, Patent
 
 
-def date_format(date: datetime) -> str:
+def date_format(date: datetime | None) -> str:
+    if not date:  # e.g. no grant date yet
+        return ""
     return date.strftime("%d/%m/%Y")
 
 
-def get_excel_from_template() -> Workbook:
+TEMPLATE_PATH = Path(
+    os.getenv(
+        "PATRICIA_TEMPLATE_PATH",
+        Path(__file__).parents[2]
+        / "documentation"
+        / "Standard_template Excel Conversion.xlsx",
+    )
+)
+
+
+STYLE_ATTRIBUTES = (
+    "font",
+    "fill",
+    "border",
+    "alignment",
+    "protection",
+    "number_format",
+)
+
+
+def style_of(styled, known: dict) -> dict | None:
+    """
+    Returns the formatting of a cell or column as {style attribute: value}, or None without any.
+    Equal formattings are returned as the same dict, kept in known.
+    """
+    if not styled.has_style:
+        return None
+    style = {name: copy(getattr(styled, name)) for name in STYLE_ATTRIBUTES}
+    return known.setdefault(tuple(style.values()), style)
+
+
+def apply_style(styled, style: dict | None, applied: dict) -> None:
+    """
+    Gives a cell or column of a new workbook a formatting from style_of. Setting the attributes
+    is slow, so later cells with the same formatting copy the style array of the first,
+    kept in applied by id(style).
+    """
+    if style is None:
+        return
+    style_array = applied.get(id(style))
+    if style_array is not None:
+        styled._style = copy(style_array)
+        return
+    for name, value in style.items():
+        setattr(styled, name, value)
+    applied[id(style)] = copy(styled._style)
+
+
+@dataclass
+class ColumnSkeleton:
+    min: int
+    max: int
+    width: float | None
+    hidden: bool
+    style: dict | None  # e.g. the "@" (text) number format of a column
+
+
+@dataclass
+class SheetSkeleton:
+    title: str
+    columns: dict[str, ColumnSkeleton] = field(default_factory=dict)
+    rows: list[tuple] = field(default_factory=list)  # what is left after initialize_wb
+    row_heights: dict[int, float] = field(default_factory=dict)
+    # (row, column) -> style_of the cell, for styled cells only
+    cell_styles: dict[tuple[int, int], dict] = field(default_factory=dict)
+
+
+@dataclass
+class CachedTemplate:
+    skeletons: list[SheetSkeleton]
+    default_font: Font  # of unstyled cells, MS Sans Serif in the standard template
+
+
+_template_cache = {}  # (resolved path, modification time) -> CachedTemplate
+_template_lock = threading.Lock()
+
+
+def sheet_skeleton(sheet, styles: dict) -> SheetSkeleton:
+    skeleton = SheetSkeleton(sheet.title)
+    for letter, dimension in sheet.column_dimensions.items():
+        if dimension.width or dimension.hidden or dimension.has_style:
+            skeleton.columns[letter] = ColumnSkeleton(
+                dimension.min,
+                dimension.max,
+                dimension.width,
+                dimension.hidden,
+                style_of(dimension, styles),
+            )
+    for cells in sheet.iter_rows():
+        skeleton.rows.append(tuple(cell.value for cell in cells))
+        for cell in cells:
+            style = style_of(cell, styles)
+            if style is not None:
+                skeleton.cell_styles[cell.row, cell.column] = style
+    skeleton.row_heights = {
+        row: dimension.height
+        for row, dimension in sheet.row_dimensions.items()
+        if dimension.height
+    }
+    return skeleton
+
+
+def cached_template(template_path: str | Path | None = None) -> CachedTemplate:
+    """
+    Parses and initialises the template once per process (again only if the file changes) and
+    keeps it in memory as sheet skeletons, from which every workbook is built
+    """
+    path = Path(template_path or TEMPLATE_PATH).resolve()
+    key = (path, path.stat().st_mtime_ns)
+    with _template_lock:
+        cached = _template_cache.get(key)
+        if cached is None:
+            wb = initialize_wb(load_workbook(path))
+            styles = {}
+            cached = CachedTemplate(
+                [sheet_skeleton(sheet, styles) for sheet in wb.worksheets],
+                copy(wb._fonts[0]),
+            )
+            _template_cache[key] = cached
+    return cached
+
+
+def get_excel_from_template(template_path: str | Path | None = None) -> Workbook:
     """
     Loads the template, which is an excel file with 5 sheets:
     "Instructions", "CASE_DATA", "NAME_DATA", "DESIGNATED_STATES", "CLASS_DATA"
 
-    Returns the workbook object leaving template unchanged
+    Returns a fresh, already initialised workbook object leaving template unchanged.
+    It is built from the cached sheet skeletons, so the template is only parsed the first time
+    (see cached_template), and keeps the template's column widths, hidden columns, number
+    formats and cell styles.
+    Its path defaults to TEMPLATE_PATH, set with the PATRICIA_TEMPLATE_PATH environment variable.
     """
-    wb = load_workbook(
-        Path(
-            r"C:\Users\remoteuser\Google Drive\Pythonscripts\epo_api\documentation\Standard_template Excel Conversion.xlsx"
-        )
-    )
+    return workbook_from_template(template_path)
+
+
+def workbook_from_template(
+    template_path: str | Path | None = None, write_only: bool = False
+) -> Workbook:
+    template = cached_template(template_path)
+    wb = Workbook(write_only=write_only)
+    wb._fonts = IndexedList([template.default_font])  # instead of Calibri
+    if not write_only:
+        wb.remove(wb.active)
+    applied = {}
+    for skeleton in template.skeletons:
+        sheet = wb.create_sheet(skeleton.title)
+        for letter, column in skeleton.columns.items():
+            dimension = sheet.column_dimensions[letter]
+            dimension.min, dimension.max = column.min, column.max
+            dimension.width = column.width
+            dimension.hidden = column.hidden
+            apply_style(dimension, column.style, applied)
+        for row, height in skeleton.row_heights.items():
+            sheet.row_dimensions[row].height = height
+        for row, values in enumerate(skeleton.rows, 1):
+            cells = [WriteOnlyCell(sheet, value) for value in values]
+            for column, cell in enumerate(cells, 1):
+                apply_style(cell, skeleton.cell_styles.get((row, column)), applied)
+            sheet.append(cells)
     return wb
 
 
@@ -35,95 +196,253 @@ def initialize_wb(workbook: Workbook) -> Workbook:
     return wb
 
 
-def populate_excel_one_case(wb: Workbook, patent: Patent) -> Workbook:
+def case_row(patent: Patent) -> dict[str, object]:
     """
-    Populates the CASE_DATA sheet with the data from the patent object
+    Maps a patent object to its CASE_DATA cells, by column letter
     """
-    sheet = wb["CASE_DATA"]
-    row = sheet.max_row + 1
-    sheet[f"A{row}"].value = patent.ref  # Old_Case_No
-    sheet[f"B{row}"].value = "Patent"  # Case_Type
-    sheet[f"C{row}"].value = "EP"  # Country
+    row = {}
+    row["A"] = patent.ref  # Old_Case_No
+    row["B"] = "Patent"  # Case_Type
+    row["C"] = "EP"  # Country
     if patent.wo_application_number:
-        if len(patent.priority) > 0:
+        if patent.priority:
             application_type = "PCT-Based With Priority"
         else:
             application_type = "PCT-Based Without Priority"
     else:
-        if len(patent.priority) > 0:
+        if patent.priority:
             application_type = "With Priority"
         else:
             application_type = "Without Priority"
-    sheet[f"D{row}"].value = application_type  # Application_Type
-    sheet[f"E{row}"].value = "Seek Renewal Instructions"  # Service_Level
-    sheet[f"F{row}"].value = patent.title  # Catchword
-    # sheet[f"G{row}"].value ... Case_Number_Extension
-    sheet[f"H{row}"].value = date_format(patent.filing_date)  # Application_Date
-    sheet[f"I{row}"].value = patent.ep_application_number  # Application_No
-    if len(patent.priority) == 1:
-        sheet[f"J{row}"].value = date_format(patent.priority[0].date)  # Priority_Date
-        sheet[f"K{row}"].value = patent.priority[0].number  # Priority_No
-        sheet[f"L{row}"].value = patent.priority[0].country  # Priority_Country
-    if len(patent.priority) > 1:
-        sorted_priorities = sorted(patent.priority(key=lambda x: x.date))
-        sheet[f"J{row}"].value = date_format(sorted_priorities[0].date)  # Priority_Date
-        sheet[f"K{row}"].value = sorted_priorities[0].number  # Priority_No
-        sheet[f"L{row}"].value = sorted_priorities[0].country  # Priority_Country
+    row["D"] = application_type  # Application_Type
+    row["E"] = "Seek Renewal Instructions"  # Service_Level
+    row["F"] = patent.title  # Catchword
+    # row["G"] ... Case_Number_Extension
+    row["H"] = date_format(patent.filing_date)  # Application_Date
+    row["I"] = patent.ep_application_number  # Application_No
+    priority = patent.priority or []
+    if len(priority) == 1:
+        row["J"] = date_format(priority[0].date)  # Priority_Date
+        row["K"] = priority[0].number  # Priority_No
+        row["L"] = priority[0].country  # Priority_Country
+    if len(priority) > 1:
+        sorted_priorities = sorted(priority, key=lambda x: x.date)
+        row["J"] = date_format(sorted_priorities[0].date)  # Priority_Date
+        row["K"] = sorted_priorities[0].number  # Priority_No
+        row["L"] = sorted_priorities[0].country  # Priority_Country
         add_priority_details = "Additional priorities:"
         for priority in sorted_priorities[1:]:
             add_priority_details += (
                 f"{date_format(priority.date)} {priority.number} {priority.country} |"
             )
-        sheet[f"AA{row}"].value = add_priority_details  # Notes_comments1
-    sheet[f"M{row}"].value = date_format(patent.publication_date)  # Publication_Date
-    sheet[f"N{row}"].value = patent.publication_number  # Publication_No
-    # sheet[f"O{row}"].value ... Req_For_Examination
-    # sheet[f"P{row}"].value ... Date_of_Use
+        row["AA"] = add_priority_details  # Notes_comments1
+    # publication_number/date are only set by hand, the register values are ep_publication_*
+    publication_number = patent.publication_number or patent.ep_publication_number
+    publication_date = patent.publication_date
+    if publication_date is None and patent.ep_publication_date:
+        publication_date = parse_date(patent.ep_publication_date)
+    row["M"] = date_format(publication_date)  # Publication_Date
+    row["N"] = publication_number  # Publication_No
+    # row["O"] ... Req_For_Examination
+    # row["P"] ... Date_of_Use
     if patent.is_granted:
-        sheet[f"Q{row}"].value = date_format(
-            patent.grant_date
-        )  # Registration_Grant_Date
-        sheet[f"R{row}"].value = patent.publication_number  # Registration_No
-    # sheet[f"S{row}"].value ... Next_renewal_annuity_Date
-    # sheet[f"T{row}"].value ... This column hidden in version provided by Anthony: Official_Action_Due
-    sheet[f"U{row}"].value = patent.applicants[0].unique_id  # Applicant
+        row["Q"] = date_format(patent.grant_date)  # Registration_Grant_Date
+        row["R"] = publication_number  # Registration_No
+    # row["S"] ... Next_renewal_annuity_Date
+    # row["T"] ... This column hidden in version provided by Anthony: Official_Action_Due
+    if patent.applicants:
+        row["U"] = patent.applicants[0].unique_id  # Applicant
     # TODO: Ask how to handle multiple applicants in spreadsheet
-    if len(patent.applicants) > 1:
-        sheet[f"AB{row}"].value = "Co-Applicants: " + " | ".join(
+    if patent.applicants and len(patent.applicants) > 1:
+        row["AB"] = "Co-Applicants: " + " | ".join(
             [applicant.unique_id for applicant in patent.applicants[1:]]
         )  # Notes_comments2
-    # sheet[f"V{row}"].value ... Foreign_Agent
-    sheet[
-        f"W{row}"
-    ].value = "17500"  # Kilpatrick Townsend & Stockton # Correspondence_Address
+    # row["V"] ... Foreign_Agent
+    row["W"] = "17500"  # Kilpatrick Townsend & Stockton # Correspondence_Address
     # TODO: Decide how to populate correspondence address in future - maybe in spreadsheet??
     # TODO: Or prompt user which is messy?? Or leave blank for auto generation and populate later??
-    sheet[f"X{row}"].value = "995579"  # Magic Leap # Account_Address
+    row["X"] = "995579"  # Magic Leap # Account_Address
     # TODO: Same issue as for correspondence address
-    sheet[f"Y{row}"].value = patent.inventors[0].unique_id  # Inventor_1
-    if len(patent.inventors) > 1:
-        sheet[f"Z{row}"].value = patent.inventors[1].unique_id  # Inventor_2
-    if len(patent.inventors) > 2:
+    inventors = patent.inventors or []
+    if inventors:
+        row["Y"] = inventors[0].unique_id  # Inventor_1
+    if len(inventors) > 1:
+        row["Z"] = inventors[1].unique_id  # Inventor_2
+    if len(inventors) > 2:
         co_inventor_str = "Co-Inventors: " + " | ".join(
-            [inventor.unique_id for inventor in patent.inventors[2:]]
+            [inventor.unique_id for inventor in inventors[2:]]
         )
-        if sheet[f"AB{row}"].value:  # Already co-applicant info in there
-            sheet[f"AB{row}"].value += " || " + co_inventor_str
+        if row.get("AB"):  # Already co-applicant info in there
+            row["AB"] += " || " + co_inventor_str
         else:
-            sheet[f"AB{row}"].value = co_inventor_str
-    # sheet[f"AC{row}"].value ... This column hidden in version provided by Anthony: Next_Action_Date
-    # sheet[f"AD{row}"].value ... This column hidden in version provided by Anthony: Next_Action
-    # sheet[f"AE{row}"].value ... Trademark_appearance
-    # sheet[f"AF{row}"].value ... Title_Description
-    # sheet[f"AG{row}"].value ... TM_Type
-    sheet[f"AH{row}"].value = "David Keane"  # Case_Responsible
+            row["AB"] = co_inventor_str
+    # row["AC"] ... This column hidden in version provided by Anthony: Next_Action_Date
+    # row["AD"] ... This column hidden in version provided by Anthony: Next_Action
+    # row["AE"] ... Trademark_appearance
+    # row["AF"] ... Title_Description
+    # row["AG"] ... TM_Type
+    row["AH"] = "David Keane"  # Case_Responsible
     if patent.is_granted:
-        sheet[f"AI{row}"].value = "Granted/Registered"  # Case_Status
+        row["AI"] = "Granted/Registered"  # Case_Status
     else:
-        sheet[f"AI{row}"].value = "Pending"  # Case_Status
-    sheet[f"AJ{row}"].value = patent.ref  # Agents_Ref
+        row["AI"] = "Pending"  # Case_Status
+    row["AJ"] = patent.ref  # Agents_Ref
+    return row
+
+
+def populate_excel_one_case(wb: Workbook, patent: Patent) -> Workbook:
+    """
+    Populates the CASE_DATA sheet with the data from the patent object
+    """
+    sheet = wb["CASE_DATA"]
+    row = sheet.max_row + 1
+    for column, value in case_row(patent).items():
+        sheet[f"{column}{row}"].value = value
     wb.save(
         Path(
             rf"C:\Users\remoteuser\Google Drive\Pythonscripts\epo_api\output_files\Patricia_import_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
         )
     )
+
+
+CASE_DATA_WIDTH = 37  # columns A (Old_Case_No) to AK (Your_Ref)
+NAME_DATA_WIDTH = 21  # columns A (Reference_No) to U (IS_Agent)
+DESIGNATED_STATES_WIDTH = 2  # columns A (Old_Case_No) and B (Designated_country)
+CHECKPOINT_SUFFIX = ".checkpoint.csv"
+
+
+def case_row_values(patent: Patent) -> list:
+    """
+    Returns the CASE_DATA row of patent as a list of cells, starting at column A
+    """
+    values = [None] * CASE_DATA_WIDTH
+    for column, value in case_row(patent).items():
+        values[column_index_from_string(column) - 1] = value
+    return values
+
+
+def new_export_workbook(template_path: str | Path | None = None) -> Workbook:
+    """
+    Returns a write-only workbook laid out like the template: the Instructions sheet, then every
+    other sheet with its header row, column widths and formatting and no data rows. Write-only
+    sheets take rows with append() and keep almost nothing in memory, but can only be saved once.
+    Built from the cached sheet skeletons, so the template is not parsed again.
+    """
+    return workbook_from_template(template_path, write_only=True)
+
+
+def export_cases(
+    patents: Iterable[Patent],
+    output_path: str | Path,
+    template_path: str | Path | None = None,
+    checkpoint_every: int | None = None,
+) -> int:
+    """
+    Streams one CASE_DATA row per patent into a new import workbook and saves it once, at the
+    end, returning the number of cases written. patents can be a generator, so rows are
+    written while later cases are still being fetched.
+    With checkpoint_every, the rows written so far are also appended to
+    <output_path>.checkpoint.csv every that many cases, so an interrupted export can be
+    recovered from it; the checkpoint is removed once the workbook is saved, and one left by
+    an earlier run is replaced.
+    NAME_DATA gets one row per unique_id among the applicants and inventors of the exported
+    cases, so every party CASE_DATA refers to is there and no other, and DESIGNATED_STATES one
+    row per designated state of each case. Both are appended after CASE_DATA from columns
+    gathered on the way.
+    """
+    output_path = Path(output_path)
+    wb = new_export_workbook(template_path)
+    sheet = wb["CASE_DATA"]
+    checkpoint_path = output_path.with_name(output_path.name + CHECKPOINT_SUFFIX)
+    checkpoint_path.unlink(missing_ok=True)
+    pending = []  # rows not in the checkpoint yet
+    count = 0
+    parties = {}  # unique_id -> Party, in order of first appearance
+    states = {"A": [], "B": []}  # DESIGNATED_STATES columns
+    try:
+        for patent in patents:
+            values = case_row_values(patent)
+            sheet.append(values)
+            count += 1
+            for party in (patent.applicants or []) + (patent.inventors or []):
+                parties.setdefault(party.unique_id, party)
+            designated_states = patent.designated_states or []
+            states["A"] += [patent.ref] * len(designated_states)
+            states["B"] += designated_states
+            if checkpoint_every:
+                pending.append(values)
+                if count % checkpoint_every == 0:
+                    append_checkpoint(checkpoint_path, pending)
+                    pending = []
+        append_columns(
+            wb["NAME_DATA"], name_data_columns(parties.values()), NAME_DATA_WIDTH
+        )
+        append_columns(wb["DESIGNATED_STATES"], states, DESIGNATED_STATES_WIDTH)
+    except BaseException:
+        for worksheet in wb.worksheets:  # release the unsaved sheets' temporary files
+            worksheet.close()
+        raise
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(output_path)
+    checkpoint_path.unlink(missing_ok=True)
+    return count
+
+
+def append_checkpoint(checkpoint_path: Path, rows: list[list]) -> None:
+    with open(checkpoint_path, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+
+def name_data_columns(parties: Iterable[Party]) -> dict[str, list]:
+    """
+    Maps parties to their NAME_DATA cells, one list per column letter with one entry per party.
+    The last line of a multi-line address is taken as the City; address lines beyond the
+    third are joined into Address_row3.
+    """
+    parties = list(parties)
+    addresses = [
+        [
+            line
+            for line in (
+                party.address_1,
+                party.address_2,
+                party.address_3,
+                party.address_4,
+                party.address_5,
+            )
+            if line
+        ]
+        for party in parties
+    ]
+    cities = [lines.pop() if len(lines) > 1 else None for lines in addresses]
+    return {
+        "A": [party.unique_id for party in parties],  # Reference_No
+        "B": [
+            "TRUE" if party.is_legal_entity else "FALSE" for party in parties
+        ],  # Legal_entity
+        "C": [party.first_name.strip() or None for party in parties],  # First_Name
+        "E": [party.last_name.strip() or None for party in parties],  # Surname
+        "F": [party.company_name or None for party in parties],  # Name
+        "H": [lines[0] if lines else None for lines in addresses],  # Address_row1
+        "I": [lines[1] if len(lines) > 1 else None for lines in addresses],
+        "J": [", ".join(lines[2:]) or None for lines in addresses],  # Address_row3
+        "M": cities,  # City
+        "N": [party.address_country or None for party in parties],  # Country
+        "U": ["FALSE"] * len(parties),  # IS_Agent: the register has no agents here
+    }
+
+
+def append_columns(sheet, columns: dict[str, list], width: int) -> int:
+    """
+    Appends the rows held in columns, lists of equal length keyed by column letter, to sheet;
+    letters that are missing are left empty. Returns the number of rows appended.
+    """
+    length = len(next(iter(columns.values()), []))
+    empty = [None] * length
+    by_index = {
+        column_index_from_string(column): values for column, values in columns.items()
+    }
+    full_columns = [by_index.get(index, empty) for index in range(1, width + 1)]
+    for values in zip(*full_columns):
+        sheet.append(values)
+    return length
@@ -0,0 +1,152 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_TTL = 7 * 24 * 60 * 60  # a week, matching how often portfolios are refreshed
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+@dataclass
+class CachedExtract:
+    key: str
+    content: bytes  # raw response body exactly as received from OPS
+    etag: str | None = None
+    last_modified: str | None = None
+    fetched_at: float = 0.0  # time.time() of the last download or successful revalidation
+
+
+class ExtractCache:
+    """
+    Persistent SQLite cache of raw register extracts, keyed by normalized number (see cache_key).
+    Entries older than ttl seconds are stale and should be revalidated or downloaded again;
+    ttl=None keeps entries fresh forever, which is what the test suite uses.
+    When the stored bodies exceed max_bytes the least recently used entries are evicted.
+    One instance can be shared between threads.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        ttl: float | None = DEFAULT_TTL,
+        max_bytes: int | None = DEFAULT_MAX_BYTES,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extracts (
+                key TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS extracts_accessed ON extracts (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> CachedExtract | None:
+        """
+        Returns the cached entry for key, fresh or stale, or None if there is none
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, etag, last_modified, fetched_at FROM extracts WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE extracts SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return CachedExtract(key, *row)
+
+    def is_fresh(self, entry: CachedExtract) -> bool:
+        return self.ttl is None or time.time() - entry.fetched_at < self.ttl
+
+    def put(
+        self,
+        key: str,
+        content: bytes,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extracts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, content, etag, last_modified, now, now, len(content)),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def touch(self, key: str) -> None:
+        """
+        Marks an entry as fresh again after OPS confirmed it is unchanged (HTTP 304)
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE extracts SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key),
+            )
+            self._conn.commit()
+
+    def discard(self, key: str) -> None:
+        """
+        Removes an entry known to be out of date, e.g. a case a delta sync found changed
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM extracts WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.max_bytes is None:
+            return
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM extracts"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM extracts ORDER BY accessed_at"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM extracts WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM extracts")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM extracts").fetchone()[0]
+
+
+def cache_key(number_type: str, number: str, constituents: str = "biblio") -> str:
+    """
+    Builds the cache key from the output of number_normalization and the requested constituents,
+    e.g. "publication/EP3661357/biblio" or "application/EP18752141/biblio,events"
+    """
+    return f"{number_type}/{number}/{constituents}"
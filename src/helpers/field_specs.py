@@ -0,0 +1,127 @@
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+
+# Path steps with a meaning beyond "look up this key"
+FIRST = object()  # take the latest record when the register repeats a section as a list
+EACH = object()  # apply the rest of the path to every entry, single entries included
+MISSING = object()  # returned by compiled paths that do not resolve
+
+
+@lru_cache(maxsize=65536)
+def parse_date(raw_date: str) -> datetime:
+    """
+    Converts a register date such as "20180806" to a datetime, without strptime for the usual case.
+    Cached, so every case with the same date shares one (immutable) datetime object.
+    """
+    if len(raw_date) == 8 and raw_date.isdigit():
+        return datetime(int(raw_date[:4]), int(raw_date[4:6]), int(raw_date[6:]))
+    return datetime.strptime(raw_date, "%Y%m%d")
+
+
+def split_name(full_name: str) -> tuple[str, str]:
+    """
+    Splits a register name such as "SMITH, John" into last name and first name
+    """
+    last_name, first_name = full_name.split(",", 1)
+    return last_name, first_name
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """
+    Where one field of a Patent, Party or Priority comes from, relative to the section it is read from.
+    attribute may be a tuple of names when convert returns one value for each, as with split_name.
+    Fields that are not required keep their dataclass default when the path is absent.
+    """
+
+    attribute: str | tuple[str, ...]
+    path: tuple
+    convert: Callable | None = None
+    required: bool = True
+
+
+def compile_path(path: Sequence) -> Callable:
+    """
+    Turns a path such as ("reg:addressbook", "reg:name", "$") into a function that follows it
+    through a section and returns the value, or MISSING if any step is absent
+    """
+    accessor = _identity
+    for step in reversed(path):
+        if step is FIRST:
+            accessor = _first_step(accessor)
+        elif step is EACH:
+            accessor = _each_step(accessor)
+        else:
+            accessor = _key_step(step, accessor)
+    return accessor
+
+
+def _identity(node):
+    return node
+
+
+def _key_step(key: str, rest: Callable) -> Callable:
+    if rest is _identity:
+
+        def step(node):
+            return node.get(key, MISSING)
+
+    else:
+
+        def step(node):
+            child = node.get(key, MISSING)
+            return MISSING if child is MISSING else rest(child)
+
+    return step
+
+
+def _first_step(rest: Callable) -> Callable:
+    def step(node):
+        return rest(node[0] if isinstance(node, list) else node)
+
+    return step
+
+
+def _each_step(rest: Callable) -> Callable:
+    def step(node):
+        entries = node if isinstance(node, list) else [node]
+        values = [rest(entry) for entry in entries]
+        return [value for value in values if value is not MISSING]
+
+    return step
+
+
+def compile_fields(specs: Sequence[FieldSpec]) -> Callable:
+    """
+    Compiles specs once into a function fill(section, target) that sets every field on target
+    and returns it, following each path on its own with compile_path. This is the reference the
+    hand-written fill_ functions in register_parser_functions are tested against.
+    If required paths do not resolve, KeyError names every field that is missing.
+    """
+    compiled = [(compile_path(spec.path), spec) for spec in specs]
+
+    def fill(section, target):
+        missing = []
+        for accessor, spec in compiled:
+            value = accessor(section)
+            if value is MISSING:
+                if spec.required:
+                    missing.append(spec.attribute)
+                continue
+            if spec.convert is not None:
+                value = spec.convert(value)
+            if isinstance(spec.attribute, tuple):
+                for attribute, part in zip(spec.attribute, value):
+                    setattr(target, attribute, part)
+            else:
+                setattr(target, spec.attribute, value)
+        if missing:
+            names = [
+                "/".join(name) if isinstance(name, tuple) else name for name in missing
+            ]
+            raise KeyError(f"{', '.join(names)} not found in register data")
+        return target
+
+    return fill
@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from helpers.json_decoding import encode_json
+from helpers.register_parser_functions import (
+    BIBLIO_SECTION_HANDLERS,
+    PARSER_VERSION,
+    Party,
+    Patent,
+    Priority,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def biblio_fingerprint(bibliographic_data: dict) -> str:
+    """
+    Returns a stable hash of the biblio sections a Patent is filled from. Sections that do not
+    affect the Patent (e.g. classifications) and key order do not change the fingerprint.
+    Includes PARSER_VERSION, so a parser change makes every stored case "changed".
+    """
+    relevant = {
+        key: section
+        for key, section in bibliographic_data.items()
+        if key in BIBLIO_SECTION_HANDLERS
+    }
+    relevant["parser_version"] = PARSER_VERSION
+    return hashlib.sha256(encode_json(relevant, sort_keys=True)).hexdigest()
+
+
+def patent_from_fields(values: dict) -> Patent:
+    """
+    Rebuilds a Patent from the field dict made by dataclasses.asdict, as stored in the
+    FingerprintStore. Fields added to Patent since keep their defaults.
+    """
+    values = dict(values)
+    for name, item_class in (
+        ("priority", Priority),
+        ("applicants", Party),
+        ("inventors", Party),
+    ):
+        if values.get(name) is not None:
+            values[name] = [item_class(**item) for item in values[name]]
+    return Patent(**values)
+
+
+@dataclass
+class FingerprintedPatent:
+    fingerprint: str
+    patent: Patent | None  # None when the stored Patent could not be loaded
+    updated_at: float = 0.0  # time.time() of the last change
+
+
+class FingerprintStore:
+    """
+    Persistent SQLite store of the last parsed Patent of each case with the fingerprint of the
+    biblio it was parsed from, keyed by normalized number. A refresh that finds the same
+    fingerprint can reuse the stored Patent instead of parsing and exporting the case again.
+    Patents are stored as plain field dicts, not pickled dataclasses, so adding a field to
+    Patent does not break loading them. One instance can be shared between threads.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                patent BLOB NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """)
+        self._conn.commit()
+
+    def get(self, key: str) -> FingerprintedPatent | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, patent, updated_at FROM fingerprints WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        fingerprint, patent, updated_at = row
+        try:
+            patent = patent_from_fields(pickle.loads(patent))
+        except Exception:  # e.g. a row written before a Patent field was removed
+            logger.warning("Could not load the stored Patent of %s", key, exc_info=True)
+            patent = None
+        return FingerprintedPatent(fingerprint, patent, updated_at)
+
+    def put(self, key: str, fingerprint: str, patent: Patent) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?)",
+                (key, fingerprint, pickle.dumps(asdict(patent)), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[
+                0
+            ]
@@ -0,0 +1,47 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional, only makes decoding faster
+    orjson = None
+
+# name -> function decoding JSON straight from bytes (str is accepted too)
+DECODERS = {"json": json.loads}
+if orjson is not None:
+    DECODERS["orjson"] = orjson.loads
+
+decoder_name = "orjson" if orjson is not None else "json"
+_decode = DECODERS[decoder_name]
+
+
+def use_decoder(name: str) -> None:
+    """
+    Chooses the JSON decoder used by decode_json, e.g. "json" to compare with the stdlib
+    """
+    global decoder_name, _decode
+    if name not in DECODERS:
+        raise ValueError(
+            f"JSON decoder {name!r} is not available, choose from {sorted(DECODERS)}"
+        )
+    decoder_name = name
+    _decode = DECODERS[name]
+
+
+def decode_json(content: bytes | bytearray | memoryview | str):
+    """
+    Decodes a response body as received, without first copying it into a str. Register
+    responses are UTF-8, which both decoders read from bytes directly.
+    """
+    return _decode(content)
+
+
+def encode_json(obj, sort_keys: bool = False) -> bytes:
+    """
+    Encodes obj as compact UTF-8 JSON bytes, as stored in the extract cache.
+    With sort_keys the output is canonical, the same for equal objects whatever their key order.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else None)
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys
+    ).encode("utf-8")
@@ -0,0 +1,293 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from helpers.register_parser_functions import (
+    as_list,
+    document_numbers,
+    get_register_document,
+    wrap_register_document,
+)
+
+RECORDED_EXTRACTS_DIR = Path(__file__).parents[2] / "output_files"
+
+
+def default_service_lights() -> dict[str, tuple[str, int]]:
+    return {
+        "images": ("green", 200),
+        "inpadoc": ("green", 60),
+        "other": ("green", 1000),
+        "retrieval": ("green", 200),
+        "search": ("green", 30),
+    }
+
+
+@dataclass
+class StandInConfig:
+    latency: float = 0.0  # seconds added to every register response
+    latency_jitter: float = 0.0  # up to this many extra seconds, chosen at random
+    error_rate: float = 0.0  # fraction of register requests answered 503
+    # fraction of register requests answered 403 with a black light for their service
+    throttle_rate: float = 0.0
+    # idle, busy or overloaded, as sent in X-Throttling-Control
+    system_state: str = "idle"
+    service_lights: dict[str, tuple[str, int]] = field(
+        default_factory=default_service_lights
+    )
+    token_lifetime: int = 1200  # expires_in sent with each access token
+    serve_any_number: bool = False  # answer unknown numbers with a recorded extract
+    seed: int | None = None
+
+
+class OPSStandIn:
+    """
+    Local stand-in for the OPS auth and register endpoints, serving recorded extracts such as
+    those in output_files/. Latency, error rate and X-Throttling-Control responses come from
+    StandInConfig, so fetcher throughput and throttling behaviour can be measured offline.
+    Point register_access_download at it with set_ops_base_url(stand_in.base_url).
+    """
+
+    def __init__(
+        self,
+        extract_paths: list[str | Path] | None = None,
+        config: StandInConfig | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.config = config or StandInConfig()
+        self.documents = {}  # normalized number -> reg:register-document
+        self._encoded = {}  # id of document -> wrapped single-case response body
+        if extract_paths is None:
+            extract_paths = sorted(RECORDED_EXTRACTS_DIR.glob("*.json"))
+        for path in extract_paths:
+            self.add_extract(load_recorded_extract(path))
+        self.requests_served = 0
+        self.bytes_served = 0
+        self.issued_tokens = set()
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self._server = ThreadingHTTPServer((host, port), StandInRequestHandler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_extract(self, extract: dict) -> None:
+        for document in as_list(get_register_document(extract)):
+            for number in document_numbers(document):
+                self.documents[number] = document
+            self._encoded[id(document)] = json.dumps(
+                wrap_register_document(document)
+            ).encode("utf-8")
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "OPSStandIn":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def issue_token(self) -> str:
+        with self._lock:
+            token = f"stand-in-{len(self.issued_tokens) + 1}"
+            self.issued_tokens.add(token)
+        return token
+
+    def find_document(self, number: str) -> dict | None:
+        document = self.documents.get(number)
+        if document is None and self.config.serve_any_number and self.documents:
+            document = next(iter(self.documents.values()))
+        return document
+
+    def roll(self, rate: float) -> bool:
+        with self._lock:
+            return self._random.random() < rate
+
+    def throttling_header(self, black_service: str | None = None) -> str:
+        lights = [
+            f"{service}={'black' if service == black_service else colour}:{limit}"
+            for service, (colour, limit) in self.config.service_lights.items()
+        ]
+        return f"{self.config.system_state} ({', '.join(lights)})"
+
+    def record(self, size: int) -> int:
+        with self._lock:
+            self.requests_served += 1
+            self.bytes_served += size
+            return self.bytes_served
+
+
+def load_recorded_extract(path: str | Path) -> dict:
+    """
+    Reads a recorded extract; older recordings were saved in the Windows code page, not UTF-8
+    """
+    content = Path(path).read_bytes()
+    try:
+        return json.loads(content.decode("utf-8"))
+    except UnicodeDecodeError:
+        return json.loads(content.decode("cp1252"))
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like OPS
+    disable_nagle_algorithm = True  # otherwise every keep-alive response waits ~40 ms
+
+    def log_message(self, format, *args) -> None:
+        pass  # one line per request would swamp a 10k case run
+
+    def send_json(
+        self, status: int, body: dict | bytes | None, headers: dict | None = None
+    ):
+        if isinstance(body, bytes):
+            content = body
+        else:
+            content = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+        return len(content)
+
+    def do_POST(self) -> None:
+        stand_in = self.server.stand_in
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlsplit(self.path).path != "/3.2/auth/accesstoken":
+            self.send_json(404, None)
+            return
+        self.send_json(
+            200,
+            {
+                "access_token": stand_in.issue_token(),
+                "token_type": "BearerToken",
+                "expires_in": str(stand_in.config.token_lifetime),
+            },
+        )
+
+    def do_GET(self) -> None:
+        stand_in = self.server.stand_in
+        config = stand_in.config
+        url = urlsplit(self.path)
+        authorization = self.headers.get("Authorization", "")
+        if authorization.removeprefix("Bearer ") not in stand_in.issued_tokens:
+            self.send_json(401, None)
+            return
+        if config.latency or config.latency_jitter:
+            time.sleep(
+                config.latency + stand_in._random.random() * config.latency_jitter
+            )
+        service = "search" if url.path.endswith("/search") else "other"
+        if stand_in.roll(config.throttle_rate):
+            self.send_json(
+                403, None, {"X-Throttling-Control": stand_in.throttling_header(service)}
+            )
+            return
+        if stand_in.roll(config.error_rate):
+            self.send_json(503, None)
+            return
+        if service == "search":
+            status, body = self.search(stand_in, parse_qs(url.query).get("q", [""])[0])
+        else:
+            status, body = self.retrieve(stand_in, url.path)
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8") if body is not None else b""
+        # counted before the response goes out, so a client never sees a stale count
+        bytes_served = stand_in.record(len(body))
+        headers = {
+            "X-Throttling-Control": stand_in.throttling_header(),
+            "X-IndividualQuotaPerHour-Used": str(bytes_served),
+        }
+        self.send_json(status, body, headers)
+
+    def retrieve(self, stand_in: OPSStandIn, path: str) -> tuple[int, bytes | None]:
+        match = re.fullmatch(
+            r"/rest-services/register/(publication|application)/epodoc/([^/]+)/[\w,-]+",
+            path,
+        )
+        document = stand_in.find_document(match.group(2)) if match else None
+        if document is None:
+            return 404, None
+        return 200, stand_in._encoded[id(document)]  # encoded once, at load
+
+    def search(self, stand_in: OPSStandIn, query: str) -> tuple[int, dict | None]:
+        numbers = re.findall(r"(?:pn|ap)=(\w+)", query)
+        if numbers:
+            documents = [stand_in.find_document(number) for number in numbers]
+            documents = [document for document in documents if document is not None]
+        else:  # applicant, representative and date queries match every recorded case
+            documents = list(stand_in.documents.values())
+        documents = list({id(document): document for document in documents}.values())
+        begin, end = 1, 25
+        if "Range" in self.headers:
+            begin, end = (int(part) for part in self.headers["Range"].split("-"))
+        page = documents[begin - 1 : end]
+        if not page:
+            return 404, None
+        return 200, {
+            "ops:world-patent-data": {
+                "ops:register-search": {
+                    "@total-result-count": str(len(documents)),
+                    "ops:query": {"@syntax": "CQL", "$": query},
+                    "ops:range": {"@begin": str(begin), "@end": str(end)},
+                    "reg:register-documents": {
+                        "reg:register-document": page if len(page) > 1 else page[0]
+                    },
+                }
+            }
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded OPS extracts locally")
+    parser.add_argument("extracts", nargs="*", help="recorded extract files")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--system-state", default="idle")
+    parser.add_argument("--serve-any-number", action="store_true")
+    parser.add_argument(
+        "--requests-per-minute", type=int, help="register limit in X-Throttling-Control"
+    )
+    args = parser.parse_args()
+    service_lights = default_service_lights()
+    if args.requests_per_minute:
+        service_lights["other"] = ("green", args.requests_per_minute)
+    stand_in = OPSStandIn(
+        args.extracts or None,
+        StandInConfig(
+            latency=args.latency,
+            latency_jitter=args.latency_jitter,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            system_state=args.system_state,
+            service_lights=service_lights,
+            serve_any_number=args.serve_any_number,
+        ),
+        port=args.port,
+    )
+    print(f"OPS stand-in on {stand_in.base_url}, set OPS_BASE_URL to use it")
+    stand_in._server.serve_forever()
@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+from dataclasses import fields
+from operator import attrgetter
+
+
+class PartyRegistry:
+    """
+    Keeps one Party object per distinct party, so that the same applicant or inventor found on
+    several cases shares one unique_id on the NAME_DATA sheet. Parties are indexed by every field
+    that takes part in ==, i.e. all but unique_id, so each lookup is a dict lookup.
+    Use one registry per import job; max_parties bounds it, least recently seen first out, at
+    the cost of a party evicted mid-job getting a new unique_id if it appears again.
+    One registry can be shared between threads.
+    """
+
+    def __init__(self, max_parties: int | None = None):
+        self.max_parties = max_parties
+        self._parties = OrderedDict()  # identity key -> Party
+        self._lock = threading.Lock()
+        self._identity_getters = {}  # dataclass -> attrgetter of its compared fields
+
+    def identity(self, party) -> tuple:
+        party_type = type(party)
+        getter = self._identity_getters.get(party_type)
+        if getter is None:
+            names = [field.name for field in fields(party_type) if field.compare]
+            getter = attrgetter(*names)
+            self._identity_getters[party_type] = getter
+        return getter(party)
+
+    def register(self, party):
+        """
+        Returns the registered party identical to party except for unique_id, or registers and
+        returns party itself if there is none
+        """
+        key = self.identity(party)
+        with self._lock:
+            existing = self._parties.get(key)
+            if existing is not None:
+                self._parties.move_to_end(key)
+                return existing
+            self._parties[key] = party
+            if self.max_parties is not None and len(self._parties) > self.max_parties:
+                self._parties.popitem(last=False)
+        return party
+
+    def parties(self) -> list:
+        with self._lock:
+            return list(self._parties.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._parties.clear()
+
+    def __len__(self) -> int:
+        return len(self._parties)
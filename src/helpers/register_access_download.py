@@ -1,31 +1,357 @@
+import asyncio
 import base64
 import requests
-import json
+import logging
 import os
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import pandas as pd
 import chardet
 from dotenv import load_dotenv
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from helpers.capture_archive import CaptureArchive
+from helpers.json_decoding import decode_json, encode_json
+from helpers.register_parser_functions import document_numbers, wrap_register_document
+from helpers.extract_cache import DEFAULT_MAX_BYTES, DEFAULT_TTL, ExtractCache, cache_key
 
 
 load_dotenv()
 CONSUMER_KEY = os.getenv("CONSUMER_KEY")
 CONSUMER_SECRET_KEY = os.getenv("CONSUMER_SECRET_KEY")
+logger = logging.getLogger(__name__)
 
 
 CRED = base64.b64encode(f"{CONSUMER_KEY}:{CONSUMER_SECRET_KEY}".encode("utf-8"))
-AUTH_URL = "https://ops.epo.org/3.2/auth/accesstoken"
+# OPS_BASE_URL can point at a local stand-in (see helpers.ops_stand_in) for offline runs
+OPS_BASE_URL = os.getenv("OPS_BASE_URL", "https://ops.epo.org")
+AUTH_URL = f"{OPS_BASE_URL}/3.2/auth/accesstoken"
+REGISTER_URL = f"{OPS_BASE_URL}/rest-services/register"
 
 
-def get_access_token() -> str:
+def set_ops_base_url(base_url: str) -> None:
+    """
+    Points every OPS request at base_url, e.g. the address of a running OPSStandIn
+    """
+    global OPS_BASE_URL, AUTH_URL, REGISTER_URL
+    OPS_BASE_URL = base_url.rstrip("/")
+    AUTH_URL = f"{OPS_BASE_URL}/3.2/auth/accesstoken"
+    REGISTER_URL = f"{OPS_BASE_URL}/rest-services/register"
+
+
+SESSION_POOL_SIZE = 10  # keep-alive connections held open per host
+REQUEST_TIMEOUT = (5.0, 30.0)  # (connect, read) seconds for every OPS request
+
+_session = None
+_session_config = {"pool_size": SESSION_POOL_SIZE, "timeout": REQUEST_TIMEOUT}
+_session_lock = threading.Lock()
+
+
+def configure_session(
+    pool_size: int = SESSION_POOL_SIZE,
+    timeout: float | tuple[float, float] = REQUEST_TIMEOUT,
+    max_retries: int = 0,
+) -> requests.Session:
+    """
+    Replaces the shared session used for all OPS requests with one holding up to pool_size
+    keep-alive connections per host. timeout is applied to every request unless overridden.
+    max_retries covers connection errors only, HTTP status codes are handled by the callers.
+    """
+    global _session
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    with _session_lock:
+        old_session, _session = _session, session
+        _session_config["pool_size"] = pool_size
+        _session_config["timeout"] = timeout
+    if old_session is not None:
+        old_session.close()
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the shared session, creating it with the default settings on first use
+    """
+    if _session is None:
+        configure_session(**_session_config)
+    return _session
+
+
+def ensure_pool_size(pool_size: int) -> None:
+    """
+    Grows the shared session's connection pool so that pool_size concurrent requests do not
+    have to queue for (or open throwaway) connections
+    """
+    if _session_config["pool_size"] < pool_size:
+        configure_session(pool_size=pool_size, timeout=_session_config["timeout"])
+
+
+def ops_request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Sends one request through the shared session, applying the configured timeout
+    """
+    kwargs.setdefault("timeout", _session_config["timeout"])
+    return get_session().request(method, url, **kwargs)
+
+
+def request_access_token() -> dict:
+    """
+    Makes one OAuth round trip to OPS and returns the decoded response, which includes
+    "access_token" and "expires_in" (seconds, sent by OPS as a string)
+    """
     HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
     DATA = {"grant_type": "client_credentials"}
-    resp = requests.post(
-        AUTH_URL, auth=(CONSUMER_KEY, CONSUMER_SECRET_KEY), headers=HEADERS, data=DATA
+    resp = ops_request(
+        "POST",
+        AUTH_URL,
+        auth=(CONSUMER_KEY, CONSUMER_SECRET_KEY),
+        headers=HEADERS,
+        data=DATA,
     )
-    resp_string = str(resp.content, encoding="utf-8")
-    resp_dict = json.loads(resp_string)
-    token = resp_dict["access_token"]
-    return token
+    return decode_json(resp.content)
+
+
+class TokenManager:
+    """
+    Holds the OPS access token for reuse across calls and refreshes it a little before it expires.
+    One instance can be shared between threads and asyncio tasks; only one refresh runs at a time.
+    """
+
+    def __init__(self, refresh_margin: float = 60.0, default_lifetime: float = 1200.0):
+        self.refresh_margin = refresh_margin  # seconds before expiry at which a new token is fetched
+        self.default_lifetime = default_lifetime  # used if OPS does not send expires_in
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._token is not None
+            and time.monotonic() < self._expires_at - self.refresh_margin
+        )
+
+    def _refresh(self) -> None:
+        resp_dict = request_access_token()
+        self._token = resp_dict["access_token"]
+        lifetime = float(resp_dict.get("expires_in", self.default_lifetime))
+        self._expires_at = time.monotonic() + lifetime
+
+    def get_token(self) -> str:
+        """
+        Returns the cached token, fetching a new one if there is none or it is about to expire
+        """
+        with self._lock:
+            if not self._is_fresh():
+                self._refresh()
+            return self._token
+
+    def refresh(self, stale_token: str | None = None) -> str:
+        """
+        Forces a new token, e.g. after a 401. If another caller has already replaced stale_token,
+        the newer token is returned without another round trip.
+        """
+        with self._lock:
+            if stale_token is None or self._token == stale_token:
+                self._refresh()
+            return self._token
+
+    async def get_token_async(self) -> str:
+        """
+        Same as get_token, but runs any refresh in a worker thread so the event loop is not blocked
+        """
+        if self._is_fresh():
+            return self._token
+        return await asyncio.to_thread(self.get_token)
+
+
+token_manager = TokenManager()  # shared by every fetch in this process
+
+
+def get_access_token() -> str:
+    return token_manager.get_token()
+
+
+# OPS throttles by service; register retrieval is counted under "other", register search under "search"
+THROTTLE_SERVICES = {"register": "other", "search": "search"}
+SYSTEM_STATE_FACTORS = {"idle": 1.0, "busy": 1.5, "overloaded": 3.0}
+TRAFFIC_LIGHT_FACTORS = {"green": 1.0, "yellow": 1.5, "red": 3.0}
+BLACK_LIGHT_PAUSE = 60.0  # seconds to stop sending to a service OPS has marked black
+THROTTLE_STATUS_CODES = {403, 429, 503}
+MAX_THROTTLE_RETRIES = 5
+MAX_BACK_OFF = 120.0
+
+
+class OPSThrottlingError(Exception):
+    """
+    Raised when OPS keeps refusing requests because of throttling or an exhausted quota
+    """
+
+
+def parse_throttling_control(header: str) -> tuple[str, dict[str, tuple[str, int]]]:
+    """
+    Splits an X-Throttling-Control header such as
+    "busy (images=green:200, inpadoc=green:60, other=yellow:1000, retrieval=green:200, search=red:30)"
+    into the system state and a dictionary of {service: (traffic light colour, requests per minute)}
+    """
+    system_state = header.split("(", 1)[0].strip().lower()
+    services = {}
+    for service, colour, limit in re.findall(r"(\w+)=(\w+):(\d+)", header):
+        services[service] = (colour.lower(), int(limit))
+    return system_state, services
+
+
+class ThrottleScheduler:
+    """
+    Spaces out requests per OPS service according to the limits OPS reports in the
+    X-Throttling-Control header of each response, and backs off when OPS refuses requests.
+    Safe to share between threads; callers only sleep outside the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._interval = {}  # service -> seconds between requests
+        self._next_slot = {}  # service -> monotonic time of the next allowed request
+        self.system_state = "idle"
+        self.quota_used_per_hour = None
+        self.quota_used_per_week = None
+
+    def wait(self, service: str) -> None:
+        """
+        Blocks until the next request to service may be sent, and reserves that slot
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(service, 0.0))
+            self._next_slot[service] = slot + self._interval.get(service, 0.0)
+        if slot > now:
+            time.sleep(slot - now)
+
+    def update(self, service: str, headers) -> None:
+        """
+        Adjusts the request rate from the throttling and quota headers of an OPS response
+        """
+        header = headers.get("X-Throttling-Control")
+        with self._lock:
+            if "X-IndividualQuotaPerHour-Used" in headers:
+                self.quota_used_per_hour = int(headers["X-IndividualQuotaPerHour-Used"])
+            if "X-RegisteredQuotaPerWeek-Used" in headers:
+                self.quota_used_per_week = int(headers["X-RegisteredQuotaPerWeek-Used"])
+            if not header:
+                return
+            self.system_state, services = parse_throttling_control(header)
+            state_factor = SYSTEM_STATE_FACTORS.get(self.system_state, 1.0)
+            for name, (colour, limit) in services.items():
+                if colour == "black":
+                    self._next_slot[name] = max(
+                        self._next_slot.get(name, 0.0),
+                        time.monotonic() + BLACK_LIGHT_PAUSE,
+                    )
+                    continue
+                colour_factor = TRAFFIC_LIGHT_FACTORS.get(colour, 1.0)
+                self._interval[name] = 60.0 / limit * state_factor * colour_factor
+
+    def back_off(self, service: str, attempt: int, retry_after: str | None = None) -> None:
+        """
+        Pauses service after a refused request, exponentially in attempt unless OPS sent Retry-After
+        """
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = min(MAX_BACK_OFF, 2.0 ** (attempt + 1))
+        with self._lock:
+            self._next_slot[service] = max(
+                self._next_slot.get(service, 0.0), time.monotonic() + delay
+            )
+
+
+throttle = ThrottleScheduler()  # shared by every fetch in this process
+
+
+def ops_get(
+    url: str,
+    service: str,
+    token: str | None = None,
+    headers: dict | None = None,
+    params: dict | None = None,
+) -> requests.Response:
+    """
+    Sends an authenticated GET to OPS through the shared session, respecting the throttle for service.
+    A 401 triggers one token refresh. Throttling responses are retried with back-off, and an
+    OPSThrottlingError is raised if OPS reports an exhausted quota or keeps refusing.
+    Any other response, successful or not, is returned to the caller.
+    """
+    if token is None:
+        token = token_manager.get_token()
+    headers = {"Accept": "application/json", **(headers or {})}
+    refreshed = False
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        throttle.wait(service)
+        headers["Authorization"] = f"Bearer {token}"
+        resp = ops_request("GET", url, headers=headers, params=params)
+        throttle.update(service, resp.headers)
+        if resp.status_code == 401 and not refreshed:
+            token = token_manager.refresh(stale_token=token)
+            refreshed = True
+            headers["Authorization"] = f"Bearer {token}"
+            resp = ops_request("GET", url, headers=headers, params=params)
+            throttle.update(service, resp.headers)
+        if resp.status_code not in THROTTLE_STATUS_CODES:
+            return resp
+        rejection_reason = resp.headers.get("X-Rejection-Reason")
+        if rejection_reason:  # e.g. IndividualQuotaPerHour, no point retrying within this run
+            raise OPSThrottlingError(f"OPS quota exhausted ({rejection_reason}): {url}")
+        throttle.back_off(service, attempt, resp.headers.get("Retry-After"))
+    raise OPSThrottlingError(
+        f"OPS still throttling after {MAX_THROTTLE_RETRIES} retries (HTTP {resp.status_code}): {url}"
+    )
+
+
+extract_cache = None  # ExtractCache checked by retrieve_one_extract, off unless configure_cache is called
+
+
+def configure_cache(
+    path: str | Path | None,
+    ttl: float | None = DEFAULT_TTL,
+    max_bytes: int | None = DEFAULT_MAX_BYTES,
+) -> ExtractCache | None:
+    """
+    Turns on the persistent extract cache at path, or turns it off if path is None
+    """
+    global extract_cache
+    if extract_cache is not None:
+        extract_cache.close()
+    extract_cache = ExtractCache(path, ttl, max_bytes) if path is not None else None
+    return extract_cache
+
+
+capture_archive = None  # CaptureArchive receiving raw responses, off unless start_capture is called
+
+
+def start_capture(path: str | Path) -> CaptureArchive:
+    """
+    Starts appending every raw register response to the compressed archive at path
+    """
+    global capture_archive
+    stop_capture()
+    capture_archive = CaptureArchive(path)
+    return capture_archive
+
+
+def stop_capture() -> None:
+    global capture_archive
+    if capture_archive is not None:
+        capture_archive.close()
+        capture_archive = None
 
 
 def number_normalization(number: str | int) -> tuple[str, str]:
@@ -48,40 +374,234 @@ def number_normalization(number: str | int) -> tuple[str, str]:
     return number_type, number
 
 
-def retrieve_one_extract(number_type: str, number: str, token: str) -> dict:
-    headers = {"Accept": "application/json", "Authorization": f"Bearer {token}"}
-    url = f"http://ops.epo.org/rest-services/register/{number_type}/epodoc/{number}/biblio"
-    resp = requests.get(url, headers=headers)
-    if resp.status_code != 200:
+REGISTER_CONSTITUENTS = ("biblio", "events", "procedural-steps", "upp")
+
+
+def retrieve_one_extract(
+    number_type: str,
+    number: str,
+    token: str | None = None,
+    constituents: Iterable[str] = ("biblio",),
+) -> dict:
+    """
+    Retrieves the register extract for one normalized number. Several constituents, e.g.
+    ("biblio", "events", "procedural-steps"), come back in a single request and can be
+    separated with split_register_document.
+    """
+    constituents = ",".join(constituents)
+    for constituent in constituents.split(","):
+        if constituent not in REGISTER_CONSTITUENTS:
+            raise ValueError(f"Unknown register constituent: {constituent}")
+    cache = extract_cache
+    key = cache_key(number_type, number, constituents)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None and cache.is_fresh(cached):
+        return decode_json(cached.content)
+    headers = {}
+    if cached is not None:  # stale, ask OPS whether it has changed
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+    url = f"{REGISTER_URL}/{number_type}/epodoc/{number}/{constituents}"
+    resp = ops_get(url, THROTTLE_SERVICES["register"], token=token, headers=headers)
+    if resp.status_code == 304 and cached is not None:
+        cache.touch(key)
+        return decode_json(cached.content)
+    if resp.status_code != 200:  # throttling never gets here, ops_get retries or raises
         return {"invalid_number": str(number)}
-    resp_dict = json.loads(resp.content)
-    with open(r"output_files/test_register_extract.json", "w") as f:
-        f.write(str(resp.content, encoding="utf-8"))
-    return resp_dict
-
-
-# def retrieve_applicant_cases(applicant_name, token):
-#     headers = {"Accept": "application/json", "Authorization": f"Bearer {token}"}
-#     url = f"http://ops.epo.org/rest-services/register/search/?q=pa%3D{applicant_name}"
-
-#     resp = requests.get(url, headers=headers)
-#     resp_string = str(resp.content, encoding="utf-8")
-#     print(resp_string)
-#     resp_dict = json.loads(resp_string)
-#     return resp.json()
-
-
-# def retrieve_representative_cases(
-#     representative_name, token
-# ):  # publication or application or priority
-#     headers = {"Accept": "application/json", "Authorization": f"Bearer {token}"}
-#     url = f"http://ops.epo.org/rest-services/register/search/?q=re%3D{representative_name}"
-
-#     resp = requests.get(url, headers=headers)
-#     resp_string = str(resp.content, encoding="utf-8")
-#     print(resp_string)
-#     resp_dict = json.loads(resp_string)
-#     return resp.json()
+    if cache is not None:
+        cache.put(
+            key,
+            resp.content,
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+        )
+    if capture_archive is not None:
+        capture_archive.capture(number, resp.content, url)
+    return decode_json(resp.content)
+
+
+SEARCH_PAGE_SIZE = 100  # the largest range OPS returns per search request
+SEARCH_PREFETCH = 2  # pages fetched ahead of the one being consumed
+SEARCH_RESULT_WINDOW = 2000  # OPS serves no results beyond this, whatever the total
+
+
+class SearchTruncatedError(Exception):
+    """
+    Raised by search_register(strict=True) when a query matches more cases than OPS serves
+    """
+
+    def __init__(self, query: str, total: int):
+        super().__init__(
+            f"Register search {query} matches {total} cases, "
+            f"only the first {SEARCH_RESULT_WINDOW} can be retrieved"
+        )
+        self.query = query
+        self.total = total
+
+
+def cql_phrase(text: str) -> str:
+    """
+    Quotes text as a CQL phrase, e.g. for pa= or re=. Double quotes inside it, as in
+    "wilhelmstal" Ernst & Sohn GmbH & Co KG, would end the phrase early, so they are dropped.
+    """
+    return '"' + " ".join(text.replace('"', " ").split()) + '"'
+
+
+def fetch_search_page(
+    query: str, begin: int, page_size: int = SEARCH_PAGE_SIZE, token: str | None = None
+) -> tuple[int, list[dict]]:
+    """
+    Fetches results begin to begin + page_size - 1 of a CQL register search and returns the
+    total result count with the list of reg:register-document entries on that page.
+    OPS answers 404 when nothing (more) matches, which is returned as (0, []).
+    """
+    resp = ops_get(
+        f"{REGISTER_URL}/search",
+        THROTTLE_SERVICES["search"],
+        token=token,
+        headers={"Range": f"{begin}-{begin + page_size - 1}"},
+        params={"q": query},
+    )
+    if resp.status_code == 404:
+        return 0, []
+    resp.raise_for_status()
+    search = decode_json(resp.content)["ops:world-patent-data"]["ops:register-search"]
+    total = int(search["@total-result-count"])
+    documents = search.get("reg:register-documents", {}).get(
+        "reg:register-document", []
+    )
+    if not isinstance(documents, list):  # single result
+        documents = [documents]
+    return total, documents
+
+
+def search_register(
+    query: str,
+    token: str | None = None,
+    page_size: int = SEARCH_PAGE_SIZE,
+    prefetch: int = SEARCH_PREFETCH,
+    strict: bool = False,
+) -> Iterator[dict]:
+    """
+    Yields every reg:register-document matching a CQL query, walking the results page by page.
+    Up to `prefetch` further pages are downloaded while the caller works through the current one,
+    so at most prefetch + 1 pages are held in memory.
+    OPS only serves the first SEARCH_RESULT_WINDOW results; beyond that the search is
+    truncated with a warning, and a narrower query is needed to reach the rest. With strict,
+    SearchTruncatedError is raised instead, before any document is yielded.
+    """
+    total, documents = fetch_search_page(
+        query, 1, min(page_size, SEARCH_RESULT_WINDOW), token
+    )
+    last = min(total, SEARCH_RESULT_WINDOW)
+    if total > last and strict:
+        raise SearchTruncatedError(query, total)
+    if total > last:
+        logger.warning(
+            "Register search %s matches %d cases, only the first %d can be retrieved",
+            query,
+            total,
+            last,
+        )
+
+    def submit(begin: int):
+        size = min(page_size, last - begin + 1)
+        return executor.submit(fetch_search_page, query, begin, size, token)
+
+    begins = iter(range(1 + page_size, last + 1, page_size))
+    with ThreadPoolExecutor(max_workers=max(prefetch, 1)) as executor:
+        pending = deque(submit(begin) for begin in islice(begins, max(prefetch, 1)))
+        try:
+            yield from documents
+            while pending:
+                _, documents = pending.popleft().result()
+                for begin in islice(begins, 1):
+                    pending.append(submit(begin))
+                yield from documents
+        finally:  # caller stopped early, don't download the rest
+            for future in pending:
+                future.cancel()
+
+
+def retrieve_applicant_cases(
+    applicant_name: str, token: str | None = None, **kwargs
+) -> Iterator[dict]:
+    return search_register(f"pa={cql_phrase(applicant_name)}", token, **kwargs)
+
+
+def retrieve_representative_cases(
+    representative_name: str, token: str | None = None, **kwargs
+) -> Iterator[dict]:
+    return search_register(f"re={cql_phrase(representative_name)}", token, **kwargs)
+
+
+def crawl_applicants(names: Iterable[str], **kwargs) -> Iterator[tuple[str, dict]]:
+    """
+    Yields (applicant_name, register document) for every case of every name,
+    e.g. the lines of input_files/companies.txt. Blank lines are skipped.
+    """
+    for name in names:
+        name = name.strip()
+        if not name:
+            continue
+        for document in retrieve_applicant_cases(name, **kwargs):
+            yield name, document
+
+
+BATCH_QUERY_LIMIT = 10  # numbers combined with "or" in one register search query
+CQL_NUMBER_FIELDS = {"publication": "pn", "application": "ap"}
+
+
+def retrieve_many_extracts(
+    numbers: Iterable[tuple[str, str]],
+    token: str | None = None,
+    batch_size: int = BATCH_QUERY_LIMIT,
+) -> dict[str, dict]:
+    """
+    Takes (number_type, number) pairs from number_normalization and returns {number: extract},
+    combining up to batch_size numbers into each register search instead of one request per number.
+    Numbers the searches do not resolve are looked up with retrieve_one_extract, so invalid numbers
+    still come back as {"invalid_number": ...}. Extracts are biblio only, like the default
+    retrieve_one_extract, and are stored in the extract cache when it is on.
+    """
+    pairs = list(dict.fromkeys(numbers))
+    extracts = {}
+    cache = extract_cache
+    searchable = []
+    for number_type, number in pairs:
+        cached = cache.get(cache_key(number_type, number)) if cache else None
+        if cached is not None and cache.is_fresh(cached):
+            extracts[number] = decode_json(cached.content)
+        elif number_type in CQL_NUMBER_FIELDS:
+            searchable.append((number_type, number))
+    for start in range(0, len(searchable), batch_size):
+        batch = dict(
+            (number, number_type)
+            for number_type, number in searchable[start : start + batch_size]
+        )
+        query = " or ".join(
+            f"{CQL_NUMBER_FIELDS[number_type]}={number}"
+            for number, number_type in batch.items()
+        )
+        try:
+            documents = list(search_register(query, token))
+        except requests.HTTPError:
+            continue  # e.g. query rejected, the single lookups below cover it
+        for document in documents:
+            extract = wrap_register_document(document)
+            for number in document_numbers(document) & batch.keys():
+                extracts[number] = extract
+                if cache is not None:
+                    cache.put(
+                        cache_key(batch[number], number),
+                        encode_json(extract),
+                    )
+    for number_type, number in pairs:
+        if number not in extracts:
+            extracts[number] = retrieve_one_extract(number_type, number, token)
+    return extracts
 
 
 # if __name__ == "__main__":
@@ -1,10 +1,23 @@
 import random
+from collections.abc import Callable
+from sys import intern
 from datetime import datetime
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
+from functools import partial
 from helpers.epo_checksum import add_check_digit
-
-
-@dataclass
+from helpers.field_specs import (
+    EACH,
+    FIRST,
+    MISSING,
+    FieldSpec,
+    compile_path,
+    parse_date,
+    split_name,
+)
+from helpers.party_registry import PartyRegistry
+
+
+@dataclass(slots=True)
 class Party:
     unique_id: str = field(
         compare=False, default_factory=lambda: str(random.random())[-8:]
@@ -31,14 +44,14 @@ class Party:
     residence_country: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class Priority:
     country: str = ""
     date: datetime = ""
     number: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class Patent:
     ref: str = ""
     title: str = ""
@@ -53,55 +66,341 @@ class Patent:
     designated_states: list[str] = None
     applicants: list[Party] = None
     inventors: list[Party] = None
+    # Raw register values, kept out of repr so existing output is unchanged
+    ep_publication_number: str = field(default="", repr=False)
+    ep_publication_date: str = field(default="", repr=False)
+    wo_publication_number: str = field(default="", repr=False)
+    wo_publication_date: str = field(default="", repr=False)
 
 
-all_parties_found = []  # Used to avoid creating duplicate parties on Patricia import
+@dataclass
+class RegisterSections:
+    """
+    The constituents of one register document, as requested from retrieve_one_extract
+    """
 
+    biblio: dict = None
+    statuses: list[dict] = field(default_factory=list)
+    events: list[dict] = field(default_factory=list)
+    procedural_steps: list[dict] = field(default_factory=list)
 
-def get_application_numbers(bibliographic_data: dict) -> dict[str, str]:
+
+def get_register_document(extract: dict) -> dict:
     """
-    Takes the bibliographic data and returns a tuple of the EP and WO applications numbers if present
+    Takes a single-case register extract and returns its reg:register-document section
+    """
+    return extract["ops:world-patent-data"]["ops:register-search"][
+        "reg:register-documents"
+    ]["reg:register-document"]
+
+
+def as_list(section) -> list:
+    """
+    The register sends a dict where there is one entry and a list where there are several
+    """
+    if section is None:
+        return []
+    if isinstance(section, list):
+        return section
+    return [section]
+
+
+def split_register_document(extract: dict) -> RegisterSections:
+    """
+    Splits a register extract into its biblio, status, events and procedural steps sections.
+    Constituents that were not requested are left empty.
+    """
+    document = get_register_document(extract)
+    sections = RegisterSections()
+    sections.biblio = document.get("reg:bibliographic-data")
+    sections.statuses = as_list(
+        document.get("reg:ep-patent-statuses", {}).get("reg:ep-patent-status")
+    )
+    sections.events = as_list(
+        document.get("reg:events-data", {}).get("reg:dossier-event")
+    )
+    sections.procedural_steps = as_list(
+        document.get("reg:procedural-data", {}).get("reg:procedural-step")
+    )
+    return sections
+
+
+def document_numbers(document: dict) -> set[str]:
+    """
+    Returns the EP application and publication numbers of a reg:register-document in the form
+    produced by number_normalization, e.g. {"EP18752141", "EP3661357"}
+    """
+    biblio = document["reg:bibliographic-data"]
+    numbers = set()
+    for section in ("reg:application-reference", "reg:publication-reference"):
+        for reference in as_list(biblio.get(section)):
+            document_id = reference["reg:document-id"]
+            if document_id["reg:country"]["$"] == "EP":
+                numbers.add("EP" + document_id["reg:doc-number"]["$"])
+    return numbers
+
+
+def wrap_register_document(document: dict) -> dict:
+    """
+    Puts one document from a multi-document search back into the shape retrieve_one_extract returns
+    """
+    return {
+        "ops:world-patent-data": {
+            "ops:register-search": {
+                "@total-result-count": "1",
+                "reg:register-documents": {"reg:register-document": document},
+            }
+        }
+    }
+
+
+# Used to avoid creating duplicate parties on Patricia import when no registry is passed in
+party_registry = PartyRegistry()
+
+
+# Where each Party and Priority field is found, relative to one reg:applicant, reg:inventor
+# or reg:priority-claim entry. The fill_ functions below read them by hand, which is about
+# twice as fast as compile_fields; tests check that both give the same result.
+# Country codes and address lines repeat across parties and cases, so they are interned and
+# every Party at the same address shares the same strings.
+ADDRESS_FIELDS = [
+    FieldSpec(
+        "address_1", ("reg:addressbook", "reg:address", "reg:address-1", "$"), intern
+    ),
+    *(
+        FieldSpec(
+            f"address_{line}",
+            ("reg:addressbook", "reg:address", f"reg:address-{line}", "$"),
+            intern,
+            required=False,
+        )
+        for line in range(2, 6)
+    ),
+    FieldSpec(
+        "address_country",
+        ("reg:addressbook", "reg:address", "reg:country", "$"),
+        intern,
+    ),
+]
+APPLICANT_FIELDS = [
+    FieldSpec("company_name", ("reg:addressbook", "reg:name", "$")),
+    FieldSpec("applicant_sequence_number", ("@sequence",), int),
+    *ADDRESS_FIELDS,
+    FieldSpec("nationality", ("reg:nationality", "reg:country", "$"), intern),
+    FieldSpec("residence_country", ("reg:residence", "reg:country", "$"), intern),
+]
+INVENTOR_FIELDS = [
+    FieldSpec("inventor_sequence_number", ("@sequence",), int),
+    FieldSpec(
+        ("last_name", "first_name"), ("reg:addressbook", "reg:name", "$"), split_name
+    ),
+    *ADDRESS_FIELDS,
+]
+PRIORITY_FIELDS = [
+    FieldSpec("country", ("reg:country", "$"), intern),
+    FieldSpec("date", ("reg:date", "$"), parse_date),
+    FieldSpec("number", ("reg:doc-number", "$")),
+]
+
+
+def fill_address(party_data: dict, party: Party) -> None:
+    address = party_data["reg:addressbook"]["reg:address"]
+    party.address_1 = intern(address["reg:address-1"]["$"])
+    if "reg:address-2" in address:
+        party.address_2 = intern(address["reg:address-2"]["$"])
+    if "reg:address-3" in address:
+        party.address_3 = intern(address["reg:address-3"]["$"])
+    if "reg:address-4" in address:
+        party.address_4 = intern(address["reg:address-4"]["$"])
+    if "reg:address-5" in address:
+        party.address_5 = intern(address["reg:address-5"]["$"])
+    party.address_country = intern(address["reg:country"]["$"])
+
+
+def fill_applicant(party_data: dict, party: Party) -> Party:
+    party.company_name = party_data["reg:addressbook"]["reg:name"]["$"]
+    party.applicant_sequence_number = int(party_data["@sequence"])
+    fill_address(party_data, party)
+    party.nationality = intern(party_data["reg:nationality"]["reg:country"]["$"])
+    party.residence_country = intern(party_data["reg:residence"]["reg:country"]["$"])
+    return party
+
+
+def fill_inventor(party_data: dict, party: Party) -> Party:
+    party.inventor_sequence_number = int(party_data["@sequence"])
+    party.last_name, party.first_name = split_name(
+        party_data["reg:addressbook"]["reg:name"]["$"]
+    )
+    fill_address(party_data, party)
+    return party
+
+
+def fill_priority(priority_data: dict, priority: Priority) -> Priority:
+    priority.country = intern(priority_data["reg:country"]["$"])
+    priority.date = parse_date(priority_data["reg:date"]["$"])
+    priority.number = priority_data["reg:doc-number"]["$"]
+    return priority
+
+
+# from the reg:designation-of-states section; the first entry is the latest publication
+designated_states_path = compile_path(
+    (FIRST, "reg:designation-pct", "reg:regional", "reg:country", EACH, "$")
+)
+
+
+# Each scan_ function reads one biblio section in a single pass and returns everything the
+# getters below need from it. The getters and extract_patent are both built on these.
+
+
+def scan_application_reference(
+    application_section: dict | list,
+    convert_date: Callable[[str], datetime | str] = parse_date,
+) -> tuple[dict[str, str], datetime | str]:
+    """
+    Takes the reg:application-reference section and returns the EP and WO application numbers
+    and the EP filing date, or an empty string if no filing date is found.
+    Pass convert_date=str to keep the date as the raw register string.
     """
     application_numbers = {}
-    if isinstance(bibliographic_data["reg:application-reference"], list):
-        for entry in bibliographic_data["reg:application-reference"]:
-            if entry["reg:document-id"]["reg:country"]["$"] == "EP":
-                eight_digit_app_num = entry["reg:document-id"]["reg:doc-number"]["$"]
-                application_numbers["EP"] = add_check_digit(eight_digit_app_num)
-            else:
-                application_numbers["WO"] = entry["reg:document-id"]["reg:doc-number"][
-                    "$"
-                ]
-    else:
-        eight_digit_app_num = bibliographic_data["reg:application-reference"][
-            "reg:document-id"
-        ]["reg:doc-number"]["$"]
+    filing_date = ""
+    if not isinstance(application_section, list):
+        document_id = application_section["reg:document-id"]
+        eight_digit_app_num = document_id["reg:doc-number"]["$"]
         application_numbers["EP"] = add_check_digit(eight_digit_app_num)
+        raw_filing_date = document_id.get("reg:date", {}).get("$")
+        if raw_filing_date is not None:
+            filing_date = convert_date(raw_filing_date)
+        return application_numbers, filing_date
+    filing_date_found = False
+    for entry in application_section:
+        document_id = entry["reg:document-id"]
+        doc_number = document_id["reg:doc-number"]["$"]
+        if document_id["reg:country"]["$"] != "EP":
+            application_numbers["WO"] = doc_number
+            continue
+        application_numbers["EP"] = add_check_digit(doc_number)
+        raw_filing_date = document_id.get("reg:date", {}).get("$")
+        if not filing_date_found and raw_filing_date is not None:
+            filing_date = convert_date(raw_filing_date)
+            filing_date_found = True
+    return application_numbers, filing_date
+
+
+def scan_publication_reference(
+    publication_section: dict | list,
+    convert_date: Callable[[str], datetime | str] = parse_date,
+) -> tuple[dict, datetime | str]:
+    """
+    Takes the reg:publication-reference section and returns the EP and WO (if present) publication
+    numbers and dates, and the grant date, or an empty string if the patent is not granted.
+    Pass convert_date=str to keep the grant date as the raw register string.
+    """
+    publication_details = {}
+    grant_date = ""
+    if not isinstance(publication_section, list):
+        document_id = publication_section["reg:document-id"]
+        publication_details["EP"] = {
+            "number": document_id["reg:doc-number"]["$"],
+            "date": intern(document_id["reg:date"]["$"]),
+        }
+        return publication_details, grant_date
+    grant_date_found = False
+    for pub in publication_section:
+        document_id = pub.get("reg:document-id", {})
+        kind = document_id.get("reg:kind", {}).get("$")
+        if kind in ["A1", "A2"]:
+            country = document_id["reg:country"]["$"]
+            if country in ["EP", "WO"]:
+                publication_details[country] = {
+                    "number": document_id["reg:doc-number"]["$"],
+                    "date": intern(document_id["reg:date"]["$"]),
+                }
+        elif kind == "B1" and not grant_date_found:
+            try:
+                grant_date = convert_date(document_id["reg:date"]["$"])
+                grant_date_found = True
+            except Exception:
+                grant_date = ""
+    return publication_details, grant_date
+
+
+def scan_priority_claims(priority_section: dict | list) -> list[Priority]:
+    """
+    Takes the reg:priority-claims section and returns a list of Priority objects
+    """
+    if isinstance(
+        priority_section, list
+    ):  # republication so there are >= two gazette entries
+        priority_section = priority_section[0]
+    return [
+        fill_priority(entry, Priority())
+        for entry in as_list(priority_section["reg:priority-claim"])
+    ]
+
+
+def scan_designation_of_states(designated_state_section: dict | list) -> list[str]:
+    """
+    Takes the reg:designation-of-states section and returns the designated states as two letter
+    country codes
+    """
+    designated_states = designated_states_path(designated_state_section)
+    if designated_states is MISSING:
+        return []
+    return [intern(country) for country in designated_states]
+
+
+def latest_parties(party_section: dict | list, key: str) -> list[dict]:
+    """
+    Takes e.g. the reg:applicants section and returns the latest or only record of those parties,
+    as a list even for single party cases
+    """
+    if isinstance(party_section, list):
+        party_section = party_section[0]
+    return as_list(party_section[key])
+
+
+def scan_parties(
+    parties_section: dict, registry: PartyRegistry | None = None
+) -> tuple[list[Party], list[Party]]:
+    """
+    Takes the reg:parties section and returns the applicants and the inventors as Party objects
+    """
+    applicants = [
+        get_one_applicant(entry, registry)
+        for entry in latest_parties(parties_section["reg:applicants"], "reg:applicant")
+    ]
+    inventors = [
+        get_one_inventor(entry, registry)
+        for entry in latest_parties(parties_section["reg:inventors"], "reg:inventor")
+    ]
+    return applicants, inventors
+
+
+def scan_invention_title(title_section: dict | list) -> str:
+    """
+    Takes the reg:invention-title section and returns the English title
+    """
+    for entry in as_list(title_section):
+        if entry["@lang"] == "en":
+            return entry["$"]
 
-    return application_numbers
+
+def get_application_numbers(bibliographic_data: dict) -> dict[str, str]:
+    """
+    Takes the bibliographic data and returns a tuple of the EP and WO applications numbers if present
+    """
+    return scan_application_reference(bibliographic_data["reg:application-reference"])[
+        0
+    ]
 
 
 def get_filing_date(bibliographic_data: dict) -> datetime:
     """
     Takes the bibliographic data and returns the filing date as a datetime object, or an empty string if no filing date is found
     """
-    filing_info = bibliographic_data["reg:application-reference"]
-    if isinstance(filing_info, list):
-        for entry in filing_info:
-            try:
-                if entry["reg:document-id"]["reg:country"]["$"] == "EP":
-                    raw_filing_date = entry["reg:document-id"]["reg:date"]["$"]
-                    filing_date = datetime.strptime(raw_filing_date, "%Y%m%d")
-                    break
-            except KeyError:
-                filing_date = ""
-    else:
-        try:
-            raw_filing_date = filing_info["reg:document-id"]["reg:date"]["$"]
-            filing_date = datetime.strptime(raw_filing_date, "%Y%m%d")
-        except KeyError:
-            filing_date = ""
-    return filing_date
+    return scan_application_reference(bibliographic_data["reg:application-reference"])[
+        1
+    ]
 
 
 def get_publication_number_and_date(bibliographic_data: dict) -> dict:
@@ -109,71 +408,25 @@ def get_publication_number_and_date(bibliographic_data: dict) -> dict:
     Takes the bibliographic data and returns a dictionary of EP and WO (if present) publication numbers and dates
     such as {"EP": {"number": "3661357", "date": "20120229"}, "WO": {"number": "1097848", "date": "20120229"}}
     """
-    publication_details = {}
-    publication_section = bibliographic_data["reg:publication-reference"]
-    if isinstance(publication_section, list):
-        for pub in publication_section:
-            if pub["reg:document-id"]["reg:country"]["$"] == "EP" and pub[
-                "reg:document-id"
-            ]["reg:kind"]["$"] in ["A1", "A2"]:
-                publication_details["EP"] = {
-                    "number": pub["reg:document-id"]["reg:doc-number"]["$"],
-                    "date": pub["reg:document-id"]["reg:date"]["$"],
-                }
-            elif pub["reg:document-id"]["reg:country"]["$"] == "WO" and pub[
-                "reg:document-id"
-            ]["reg:kind"]["$"] in ["A1", "A2"]:
-                publication_details["WO"] = {
-                    "number": pub["reg:document-id"]["reg:doc-number"]["$"],
-                    "date": pub["reg:document-id"]["reg:date"]["$"],
-                }
-    else:
-        publication_details["EP"] = {
-            "number": publication_section["reg:document-id"]["reg:doc-number"]["$"],
-            "date": publication_section["reg:document-id"]["reg:date"]["$"],
-        }
-
-    return publication_details
+    return scan_publication_reference(bibliographic_data["reg:publication-reference"])[
+        0
+    ]
 
 
 def get_grant_date(bibliographic_data: dict) -> datetime:
     """'
     Takes the bibliographic data and returns the grant date as a datetime object, or an empty string if no grant date is found
     """
-    publn_info = bibliographic_data["reg:publication-reference"]
-    if isinstance(publn_info, list):
-        for entry in publn_info:
-            try:
-                if entry["reg:document-id"]["reg:kind"]["$"] == "B1":
-                    raw_grant_date = entry["reg:document-id"]["reg:date"]["$"]
-                    grant_date = datetime.strptime(raw_grant_date, "%Y%m%d")
-                    break
-            except Exception as e:
-                grant_date = ""
-        else:
-            grant_date = ""
-    else:
-        grant_date = ""
-    return grant_date
+    return scan_publication_reference(bibliographic_data["reg:publication-reference"])[
+        1
+    ]
 
 
 def get_designated_states(bibliographic_data: dict) -> list[str]:
     """
     Takes the bibliographic data and returns a list of designated states as two letter country code strings
     """
-    designated_states = []
-    designated_state_section = bibliographic_data["reg:designation-of-states"]
-    if isinstance(
-        designated_state_section, list
-    ):  # Change in designated states between publications
-        designated_state_section = designated_state_section[0]
-    if "reg:designation-pct" in designated_state_section:
-        designated_state_raw_list = designated_state_section["reg:designation-pct"][
-            "reg:regional"
-        ]["reg:country"]
-    for entry in designated_state_raw_list:
-        designated_states.append(entry["$"])
-    return designated_states
+    return scan_designation_of_states(bibliographic_data["reg:designation-of-states"])
 
 
 def is_granted(bibliographic_data: dict) -> bool:
@@ -190,166 +443,235 @@ def get_priority(bibliographic_data: dict) -> list[Priority]:
     """
     Takes the bibliographic data and returns a list of tuples of Priority objects, or an empty list if no priority information is found
     """
-    priorities = []
     if "reg:priority-claims" not in bibliographic_data:
-        return priorities
-    priority_section = bibliographic_data["reg:priority-claims"]
-    if isinstance(
-        priority_section, list
-    ):  # republication so there are >= two gazette entries
-        priority_section = priority_section[0]
-    if isinstance(
-        priority_section["reg:priority-claim"], list
-    ):  # multiple priority claims
-        for entry in priority_section["reg:priority-claim"]:
-            this_priority = Priority()
-            this_priority.country = entry["reg:country"]["$"]
-            this_priority.date = datetime.strptime(entry["reg:date"]["$"], "%Y%m%d")
-            this_priority.number = entry["reg:doc-number"]["$"]
-            priorities.append(this_priority)
-        return priorities
-    else:  # single priority claim
-        this_priority = Priority()
-        this_priority.country = priority_section["reg:priority-claim"]["reg:country"][
-            "$"
-        ]
-        this_priority.date = datetime.strptime(
-            priority_section["reg:priority-claim"]["reg:date"]["$"], "%Y%m%d"
-        )
-        this_priority.number = priority_section["reg:priority-claim"]["reg:doc-number"][
-            "$"
-        ]
-        priorities.append(this_priority)
-        return priorities
+        return []
+    return scan_priority_claims(bibliographic_data["reg:priority-claims"])
 
 
-def get_one_applicant(party_data: dict) -> Party:
+def get_one_applicant(party_data: dict, registry: PartyRegistry | None = None) -> Party:
     """
-    Takes the section of bibliographic data for a specific party and returns a Party object
+    Takes the section of bibliographic data for a specific party and returns a Party object,
+    the one already in registry (by default the module-wide one) if the party was seen before
     """
     party = Party()
     party.is_legal_entity = True  # assumption, not sure how to distinguish other than with an undependable Regex; assume for now that it's a legal entity
     party.is_applicant = True
-    party.company_name = party_data["reg:addressbook"]["reg:name"]["$"]
-    party.applicant_sequence_number = int(party_data["@sequence"])
-    party.address_1 = party_data["reg:addressbook"]["reg:address"]["reg:address-1"]["$"]
-    if "reg:address-2" in party_data["reg:addressbook"]["reg:address"]:
-        party.address_2 = party_data["reg:addressbook"]["reg:address"]["reg:address-2"][
-            "$"
-        ]
-    if "reg:address-3" in party_data["reg:addressbook"]["reg:address"]:
-        party.address_3 = party_data["reg:addressbook"]["reg:address"]["reg:address-3"][
-            "$"
-        ]
-    if "reg:address-4" in party_data["reg:addressbook"]["reg:address"]:
-        party.address_4 = party_data["reg:addressbook"]["reg:address"]["reg:address-4"][
-            "$"
-        ]
-    if "reg:address-5" in party_data["reg:addressbook"]["reg:address"]:
-        party.address_5 = party_data["reg:addressbook"]["reg:address"]["reg:address-5"][
-            "$"
-        ]
-    party.address_country = party_data["reg:addressbook"]["reg:address"]["reg:country"][
-        "$"
-    ]
-    party.nationality = party_data["reg:nationality"]["reg:country"]["$"]
-    party.residence_country = party_data["reg:residence"]["reg:country"]["$"]
-    for existing_party in all_parties_found:
-        if party == existing_party:  # identical except unique_id
-            return existing_party
-    all_parties_found.append(party)
-    return party
+    fill_applicant(party_data, party)
+    if registry is None:
+        registry = party_registry
+    return registry.register(party)
 
 
-def get_one_inventor(party_data: dict) -> Party:
+def get_one_inventor(party_data: dict, registry: PartyRegistry | None = None) -> Party:
     """
-    Takes the section of bibliographic data for a specific party and returns a Party object
+    Takes the section of bibliographic data for a specific party and returns a Party object,
+    the one already in registry (by default the module-wide one) if the party was seen before
     """
     party = Party()
     party.is_legal_entity = False
     party.is_inventor = True
-    party.inventor_sequence_number = int(party_data["@sequence"])
-    full_name = party_data["reg:addressbook"]["reg:name"]["$"]
-    party.last_name, party.first_name = full_name.split(",", 1)
-    party.address_1 = party_data["reg:addressbook"]["reg:address"]["reg:address-1"]["$"]
-    if "reg:address-2" in party_data["reg:addressbook"]["reg:address"]:
-        party.address_2 = party_data["reg:addressbook"]["reg:address"]["reg:address-2"][
-            "$"
-        ]
-    if "reg:address-3" in party_data["reg:addressbook"]["reg:address"]:
-        party.address_3 = party_data["reg:addressbook"]["reg:address"]["reg:address-3"][
-            "$"
-        ]
-    if "reg:address-4" in party_data["reg:addressbook"]["reg:address"]:
-        party.address_4 = party_data["reg:addressbook"]["reg:address"]["reg:address-4"][
-            "$"
-        ]
-    if "reg:address-5" in party_data["reg:addressbook"]["reg:address"]:
-        party.address_5 = party_data["reg:addressbook"]["reg:address"]["reg:address-5"][
-            "$"
-        ]
-    party.address_country = party_data["reg:addressbook"]["reg:address"]["reg:country"][
-        "$"
-    ]
-    for existing_party in all_parties_found:
-        if party == existing_party:  # identical except unique_id
-            return existing_party
-    all_parties_found.append(party)
-    return party
+    fill_inventor(party_data, party)
+    if registry is None:
+        registry = party_registry
+    return registry.register(party)
 
 
-def get_all_applicants(bibliographic_data: dict) -> list[Party]:
+def get_all_applicants(
+    bibliographic_data: dict, registry: PartyRegistry | None = None
+) -> list[Party]:
     """
     Finds the applicants in the bibliographic data and returns a list of Party objects
     """
-    applicants = []
-    # find the latest or only record of the applicants on the case
-    if not isinstance(bibliographic_data["reg:parties"]["reg:applicants"], list):
-        latest_applicant_raw_data = bibliographic_data["reg:parties"]["reg:applicants"][
-            "reg:applicant"
-        ]
-    else:
-        latest_applicant_raw_data = bibliographic_data["reg:parties"]["reg:applicants"][
-            0
-        ]["reg:applicant"]
-    # Loop through the list of applicants, taking account of single applicant cases where there is no list
-    if not isinstance(latest_applicant_raw_data, list):
-        latest_applicant_raw_data = [latest_applicant_raw_data]
-    for entry in latest_applicant_raw_data:
-        applicant = get_one_applicant(entry)
-        applicants.append(applicant)
-    return applicants
+    return [
+        get_one_applicant(entry, registry)
+        for entry in latest_parties(
+            bibliographic_data["reg:parties"]["reg:applicants"], "reg:applicant"
+        )
+    ]
 
 
-def get_all_inventors(bibliographic_data: dict) -> list[Party]:
+def get_all_inventors(
+    bibliographic_data: dict, registry: PartyRegistry | None = None
+) -> list[Party]:
     """
     Finds the inventors in the bibliographic data and returns a list of Party objects
     """
-    inventors = []
-    # find the latest or only record of the inventors on the case
-    if not isinstance(bibliographic_data["reg:parties"]["reg:inventors"], list):
-        latest_inventor_raw_data = bibliographic_data["reg:parties"]["reg:inventors"][
-            "reg:inventor"
-        ]
-    else:
-        latest_inventor_raw_data = bibliographic_data["reg:parties"]["reg:inventors"][
-            0
-        ]["reg:inventor"]
-    # Loop through the list of inventors, taking account of single inventor cases where there is no list
-    if not isinstance(latest_inventor_raw_data, list):
-        latest_inventor_raw_data = [latest_inventor_raw_data]
-
-    for entry in latest_inventor_raw_data:
-        inventor = get_one_inventor(entry)
-        inventors.append(inventor)
-    return inventors
+    return [
+        get_one_inventor(entry, registry)
+        for entry in latest_parties(
+            bibliographic_data["reg:parties"]["reg:inventors"], "reg:inventor"
+        )
+    ]
 
 
 def get_title(bibliographic_data: dict) -> str:
     """
     Takes the bibliographic data and returns the title
     """
-    title_section = bibliographic_data["reg:invention-title"]
-    for entry in title_section:
-        if entry["@lang"] == "en":
-            return entry["$"]
+    return scan_invention_title(bibliographic_data["reg:invention-title"])
+
+
+def fill_application_reference(patent: Patent, section: dict | list) -> None:
+    application_numbers, patent.filing_date = scan_application_reference(section)
+    patent.ep_application_number = application_numbers["EP"]
+    if "WO" in application_numbers:
+        patent.wo_application_number = application_numbers["WO"]
+
+
+def fill_publication_reference(patent: Patent, section: dict | list) -> None:
+    publication_data, patent.grant_date = scan_publication_reference(section)
+    patent.is_granted = patent.grant_date != ""
+    if "EP" in publication_data:
+        patent.ep_publication_number = publication_data["EP"]["number"]
+        patent.ep_publication_date = publication_data["EP"]["date"]
+    if "WO" in publication_data:
+        patent.wo_publication_number = publication_data["WO"]["number"]
+        patent.wo_publication_date = publication_data["WO"]["date"]
+
+
+def fill_priority_claims(patent: Patent, section: dict | list) -> None:
+    patent.priority = scan_priority_claims(section)
+
+
+def fill_designation_of_states(patent: Patent, section: dict | list) -> None:
+    patent.designated_states = scan_designation_of_states(section)
+
+
+def fill_parties(
+    patent: Patent, section: dict, registry: PartyRegistry | None = None
+) -> None:
+    patent.applicants, patent.inventors = scan_parties(section, registry)
+
+
+def fill_invention_title(patent: Patent, section: dict | list) -> None:
+    patent.title = scan_invention_title(section)
+
+
+# bump when extract_patent fills a Patent differently, so that Patents stored with a
+# fingerprint (see helpers.fingerprints) are parsed again
+PARSER_VERSION = 1
+
+# biblio section -> function filling the Patent fields that come from it
+BIBLIO_SECTION_HANDLERS = {
+    "reg:application-reference": fill_application_reference,
+    "reg:publication-reference": fill_publication_reference,
+    "reg:priority-claims": fill_priority_claims,
+    "reg:designation-of-states": fill_designation_of_states,
+    "reg:parties": fill_parties,
+    "reg:invention-title": fill_invention_title,
+}
+
+
+def extract_patent(
+    bibliographic_data: dict,
+    patent: Patent | None = None,
+    registry: PartyRegistry | None = None,
+) -> Patent:
+    """
+    Fills a Patent (a new one unless given) from the bibliographic data, visiting each biblio
+    section once instead of once per getter. Gives the same values as the individual getters.
+    Parties are deduplicated in registry, by default the module-wide one.
+    """
+    if patent is None:
+        patent = Patent()
+    handlers = BIBLIO_SECTION_HANDLERS
+    if registry is not None:
+        handlers = {
+            **handlers,
+            "reg:parties": partial(fill_parties, registry=registry),
+        }
+    patent.priority = []  # the section is absent when there is no priority claim
+    for key, section in bibliographic_data.items():
+        handler = handlers.get(key)
+        if handler is not None:
+            handler(patent, section)
+    return patent
+
+
+# Patent fields filled by each biblio section, for LazyPatent
+SECTION_FIELDS = {
+    "reg:application-reference": (
+        "ep_application_number",
+        "wo_application_number",
+        "filing_date",
+    ),
+    "reg:publication-reference": (
+        "ep_publication_number",
+        "ep_publication_date",
+        "wo_publication_number",
+        "wo_publication_date",
+        "grant_date",
+        "is_granted",
+    ),
+    "reg:priority-claims": ("priority",),
+    "reg:designation-of-states": ("designated_states",),
+    "reg:parties": ("applicants", "inventors"),
+    "reg:invention-title": ("title",),
+}
+FIELD_SECTIONS = {
+    name: section for section, names in SECTION_FIELDS.items() for name in names
+}
+PATENT_FIELDS = frozenset(patent_field.name for patent_field in fields(Patent))
+
+
+class LazyPatent(Patent):
+    """
+    A Patent that keeps the biblio section and parses each section the first time one of its
+    fields is read, e.g. reading grant_date parses the publication references only and leaves
+    parties (and the party registry) alone. Parsed fields are stored, so later reads are plain
+    attribute reads, and fields set explicitly are never overwritten.
+    """
+
+    __slots__ = ("_bibliographic_data", "_registry")
+
+    def __init__(
+        self,
+        bibliographic_data: dict,
+        ref: str = "",
+        registry: PartyRegistry | None = None,
+    ):
+        self._bibliographic_data = bibliographic_data
+        self._registry = registry
+        self.ref = ref
+
+    def __getattr__(self, name: str):
+        # only called for fields that have not been parsed or set yet
+        if name not in PATENT_FIELDS:
+            raise AttributeError(name)
+        section_key = FIELD_SECTIONS.get(name)
+        parsed = Patent(priority=[])  # defaults, as extract_patent leaves them
+        section = self._bibliographic_data.get(section_key)
+        if section_key == "reg:parties" and section is not None:
+            fill_parties(parsed, section, self._registry)
+        elif section is not None:
+            BIBLIO_SECTION_HANDLERS[section_key](parsed, section)
+        for field_name in SECTION_FIELDS.get(section_key, (name,)):
+            try:
+                object.__getattribute__(self, field_name)
+            except AttributeError:
+                setattr(self, field_name, getattr(parsed, field_name))
+        return object.__getattribute__(self, name)
+
+    def to_patent(self) -> Patent:
+        """
+        Parses every section not read yet and returns the equivalent plain Patent
+        """
+        return Patent(
+            **{
+                patent_field.name: getattr(self, patent_field.name)
+                for patent_field in fields(Patent)
+            }
+        )
+
+    def __eq__(self, other) -> bool:
+        # equal to a Patent or LazyPatent with the same field values, as parsed
+        if not isinstance(other, Patent):
+            return NotImplemented
+        return all(
+            getattr(self, patent_field.name) == getattr(other, patent_field.name)
+            for patent_field in fields(Patent)
+            if patent_field.compare
+        )
+
+    def __repr__(self) -> str:
+        return repr(self.to_patent())
@@ -0,0 +1,156 @@
+import json
+import os
+import re
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+from pathlib import Path
+
+from helpers.excel_out import export_cases
+from helpers.register_parser_functions import Patent
+
+MANIFEST_SUFFIX = ".manifest.json"
+UNSAFE_FILE_NAME_CHARACTERS = re.compile(r"[^\w.-]")
+
+
+@dataclass
+class ShardFile:
+    """One workbook written by export_sharded, as listed in the manifest"""
+
+    shard: str
+    path: str
+    cases: int
+    first_ref: str
+    last_ref: str
+
+
+def plain_patent(patent: Patent) -> Patent:
+    """
+    Returns patent as a plain Patent that can be sent to another process. A LazyPatent holds
+    the raw biblio and the party registry, so it is parsed in full first.
+    """
+    if type(patent) is Patent:
+        return patent
+    return Patent(
+        **{field.name: getattr(patent, field.name) for field in fields(Patent)}
+    )
+
+
+def shard_patents(
+    patents: Iterable[Patent],
+    shards: int | None = None,
+    ref_prefix_length: int | None = None,
+) -> dict[str, list[Patent]]:
+    """
+    Splits patents into shards, keyed by shard name and keeping their order: into `shards`
+    runs of (nearly) equal row counts, named part01, part02, ..., or with ref_prefix_length
+    into one shard per client ref prefix of that length, named after the prefix.
+    Shard names are safe to use in file names, see shard_file_name. Prefixes that only differ
+    in case share a shard, named after the first one seen, as "ab" and "AB" would otherwise
+    write the same file on case-insensitive file systems.
+    """
+    if ref_prefix_length is not None and ref_prefix_length < 1:
+        raise ValueError("Give a ref prefix length of at least 1")
+    patents = [plain_patent(patent) for patent in patents]
+    if ref_prefix_length is not None:
+        names = {}
+        by_prefix = {}
+        for patent in patents:
+            prefix = shard_file_name((patent.ref or "")[:ref_prefix_length])
+            name = names.setdefault(prefix.casefold(), prefix)
+            by_prefix.setdefault(name, []).append(patent)
+        return by_prefix
+    if not shards or shards < 1:
+        raise ValueError(
+            "Give a number of shards of at least 1, or a ref prefix length"
+        )
+    shards = min(shards, len(patents)) or 1
+    size, extra = divmod(len(patents), shards)
+    split = {}
+    start = 0
+    for number in range(shards):
+        end = start + size + (number < extra)
+        split[f"part{number + 1:02}"] = patents[start:end]
+        start = end
+    return split
+
+
+def shard_file_name(name: str) -> str:
+    """
+    Makes a ref prefix usable as part of a file name: path separators, ":" and other
+    characters that are not letters, digits, ".", "_" or "-" become "_", e.g. "ML/01" -> "ML_01"
+    """
+    name = UNSAFE_FILE_NAME_CHARACTERS.sub("_", name).strip(".")
+    return name or "no_ref"
+
+
+def export_shard(
+    shard: str,
+    patents: list[Patent],
+    output_path: str,
+    template_path: str | None = None,
+) -> ShardFile:
+    """
+    Writes one shard's import workbook; runs in a worker process of export_sharded
+    """
+    count = export_cases(patents, output_path, template_path)
+    return ShardFile(
+        shard=shard,
+        path=str(output_path),
+        cases=count,
+        first_ref=patents[0].ref if patents else "",
+        last_ref=patents[-1].ref if patents else "",
+    )
+
+
+def export_sharded(
+    patents: Iterable[Patent],
+    output_path: str | Path,
+    shards: int | None = None,
+    ref_prefix_length: int | None = None,
+    template_path: str | Path | None = None,
+    max_workers: int | None = None,
+) -> list[ShardFile]:
+    """
+    Splits patents with shard_patents and writes each shard to its own import workbook,
+    <stem>_<shard>.xlsx next to output_path, each built and saved in a separate process with
+    export_cases. Lists the workbooks in <output_path>.manifest.json and returns that list.
+    NAME_DATA in each workbook holds the parties of that shard's cases only.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    split = shard_patents(patents, shards, ref_prefix_length)
+    template = str(template_path) if template_path is not None else None
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                export_shard,
+                shard,
+                shard_cases,
+                str(output_path.with_name(f"{output_path.stem}_{shard}.xlsx")),
+                template,
+            )
+            for shard, shard_cases in split.items()
+        ]
+        files = [future.result() for future in futures]
+    write_manifest(output_path.with_name(output_path.name + MANIFEST_SUFFIX), files)
+    return files
+
+
+def write_manifest(path: Path, files: list[ShardFile]) -> None:
+    """
+    Writes the manifest through a temporary file, so it only ever lists a complete export
+    """
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "cases": sum(file.cases for file in files),
+                "files": [asdict(file) for file in files],
+            },
+            f,
+            indent=4,
+        )
+    os.replace(temporary, path)
@@ -1,54 +1,107 @@
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from helpers.fingerprints import FingerprintStore, biblio_fingerprint
 from helpers.register_access_download import (
-    get_access_token,
     number_normalization,
     retrieve_one_extract,
 )
 
+from helpers.party_registry import PartyRegistry
 from helpers.register_parser_functions import (
+    LazyPatent,
     Patent,
-    get_application_numbers,
-    get_publication_number_and_date,
-    get_filing_date,
-    get_grant_date,
-    get_designated_states,
-    is_granted,
-    get_priority,
-    get_all_applicants,
-    get_all_inventors,
-    get_title,
+    extract_patent,
+    party_registry,
+    split_register_document,
 )
 
 
-def get_full_patent_data(number, ref) -> Patent:
-    token = get_access_token()
+def get_full_patent_data(
+    number,
+    ref,
+    registry: PartyRegistry | None = None,
+    lazy: bool = False,
+    fingerprints: FingerprintStore | None = None,
+) -> Patent:
+    return fetch_patent(number, ref, registry, lazy, fingerprints)[0]
+
+
+def fetch_patent(
+    number,
+    ref,
+    registry: PartyRegistry | None = None,
+    lazy: bool = False,
+    fingerprints: FingerprintStore | None = None,
+) -> tuple[Patent, str]:
+    """
+    Does the work of get_full_patent_data and also returns whether the case is "new", "changed"
+    or "unchanged" since it was last stored in fingerprints, or "invalid". Without fingerprints
+    every valid case is "new". An unchanged case is not parsed again: the stored Patent is returned.
+    A case whose stored Patent cannot be loaded counts as "changed". lazy cannot be combined
+    with fingerprints, as the stored Patent has to be complete.
+    """
+    if lazy and fingerprints is not None:
+        raise ValueError("lazy cannot be combined with fingerprints")
     this_patent = Patent()
     this_patent.ref = ref
     number_type, number = number_normalization(number)
-    extract = retrieve_one_extract(number_type, number, token)
+    extract = retrieve_one_extract(number_type, number)  # uses the shared cached token
     if "invalid_number" in extract:
-        return Patent(title=f"not a valid number: {extract['invalid_number']}")
-    biblio = extract["ops:world-patent-data"]["ops:register-search"][
-        "reg:register-documents"
-    ]["reg:register-document"]["reg:bibliographic-data"]
-    application_numbers = get_application_numbers(biblio)
-    this_patent.ep_application_number = application_numbers["EP"]
-    if "WO" in application_numbers:
-        this_patent.wo_application_number = application_numbers["WO"]
-    publication_data = get_publication_number_and_date(biblio)
-    this_patent.ep_publication_number = publication_data["EP"]["number"]
-    this_patent.ep_publication_date = publication_data["EP"]["date"]
-    if "WO" in publication_data:
-        this_patent.wo_publication_number = publication_data["WO"]["number"]
-        this_patent.wo_publication_date = publication_data["WO"]["date"]
-    this_patent.filing_date = get_filing_date(biblio)
-    this_patent.grant_date = get_grant_date(biblio)
-    this_patent.is_granted = is_granted(biblio)
-    this_patent.priority = get_priority(biblio)
-    this_patent.designated_states = get_designated_states(biblio)
-    this_patent.applicants = get_all_applicants(biblio)
-    this_patent.inventors = get_all_inventors(biblio)
-    this_patent.title = get_title(biblio)
-    return this_patent
+        return (
+            Patent(title=f"not a valid number: {extract['invalid_number']}"),
+            "invalid",
+        )
+    biblio = split_register_document(extract).biblio
+    if fingerprints is None:
+        if lazy:  # for jobs that read only a few fields
+            return LazyPatent(biblio, ref, registry), "new"
+        return extract_patent(biblio, this_patent, registry), "new"
+    fingerprint = biblio_fingerprint(biblio)
+    stored = fingerprints.get(number)
+    if (
+        stored is not None
+        and stored.patent is not None
+        and stored.fingerprint == fingerprint
+    ):
+        patent = stored.patent
+        patent.ref = ref
+        if registry is None:
+            registry = party_registry
+        # so parties stored with the case keep matching those parsed from other cases
+        patent.applicants = [registry.register(party) for party in patent.applicants]
+        patent.inventors = [registry.register(party) for party in patent.inventors]
+        return patent, "unchanged"
+    patent = extract_patent(biblio, this_patent, registry)
+    fingerprints.put(number, fingerprint, patent)
+    return patent, "new" if stored is None else "changed"
+
+
+@dataclass
+class RefreshReport:
+    patents: list[Patent] = field(default_factory=list)
+    new: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+    invalid: list[str] = field(default_factory=list)
+
+
+def refresh_patents(
+    numbers_and_refs: Iterable[tuple],
+    fingerprints: FingerprintStore,
+    registry: PartyRegistry | None = None,
+) -> RefreshReport:
+    """
+    Fetches every case of a portfolio, parsing only those whose biblio changed since the last
+    refresh, and reports which cases are new, changed, unchanged or invalid, by input number.
+    Exports can then be limited to report.new + report.changed.
+    """
+    report = RefreshReport()
+    for number, ref in numbers_and_refs:
+        patent, status = fetch_patent(number, ref, registry, fingerprints=fingerprints)
+        report.patents.append(patent)
+        getattr(report, status).append(number)
+    return report
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+import pandas as pd
+from helpers.batch_parse import parse_extracts_to_frames
+from helpers.ops_stand_in import load_recorded_extract
+from helpers.party_registry import PartyRegistry
+from helpers.register_parser_functions import extract_patent, split_register_document
+
+RECORDED_EXTRACTS = [
+    "output_files/sample_extract.json",
+    "output_files/test_register_extract.json",
+]
+
+
+def test_frames_match_extract_patent():
+    extracts = [load_recorded_extract(path) for path in RECORDED_EXTRACTS]
+    frames = parse_extracts_to_frames(extracts + [{"invalid_number": "EP123"}])
+    assert frames.invalid_numbers == ["EP123"]
+    assert len(frames.cases) == 2
+    for column in ["filing_date", "grant_date", "ep_publication_date"]:
+        assert pd.api.types.is_datetime64_any_dtype(frames.cases[column])
+    assert pd.api.types.is_datetime64_any_dtype(frames.priorities["date"])
+
+    for extract in extracts:
+        patent = extract_patent(
+            split_register_document(extract).biblio, registry=PartyRegistry()
+        )
+        case = frames.cases.loc[patent.ep_application_number]
+        assert case["title"] == patent.title
+        assert case["filing_date"] == pd.Timestamp(patent.filing_date)
+        assert case["is_granted"] == patent.is_granted
+        if patent.is_granted:
+            assert case["grant_date"] == pd.Timestamp(patent.grant_date)
+        else:
+            assert pd.isna(case["grant_date"])
+        on_case = frames.designated_states["ep_application_number"]
+        assert (
+            list(
+                frames.designated_states[on_case == patent.ep_application_number][
+                    "designated_country"
+                ]
+            )
+            == patent.designated_states
+        )
+        priorities = frames.priorities[
+            frames.priorities["ep_application_number"] == patent.ep_application_number
+        ]
+        assert list(priorities["number"]) == [p.number for p in patent.priority]
+        parties = frames.parties[
+            frames.parties["ep_application_number"] == patent.ep_application_number
+        ]
+        assert (parties["role"] == "applicant").sum() == len(patent.applicants)
+        assert (parties["role"] == "inventor").sum() == len(patent.inventors)
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import pytest
+import helpers.bulk_fetch as bulk_fetch
+from helpers.bulk_fetch import fetch_extracts_sync
+from helpers.register_parser_functions import wrap_register_document
+
+
+def fake_extract(number_type, number):
+    document_id = {"reg:country": {"$": "EP"}, "reg:doc-number": {"$": number[2:]}}
+    extract = wrap_register_document(
+        {
+            "reg:bibliographic-data": {
+                "reg:application-reference": {"reg:document-id": document_id}
+            }
+        }
+    )
+    return {**extract, "number_type": number_type, "number": number}
+
+
+def test_fetch_extracts_bounded_concurrency(monkeypatch):
+    """
+    tests that every number is answered after normalization, that duplicates of the same
+    normalized number are fetched once and that no more than `concurrency` requests are
+    in flight at any time
+    """
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+    fetched = []
+
+    def fake_retrieve_one_extract(number_type, number, constituents):
+        with lock:
+            fetched.append(number)
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return fake_extract(number_type, number)
+
+    async def fake_get_token_async():
+        return "token"
+
+    monkeypatch.setattr(bulk_fetch, "retrieve_one_extract", fake_retrieve_one_extract)
+    monkeypatch.setattr(bulk_fetch, "ensure_pool_size", lambda pool_size: None)
+    monkeypatch.setattr(
+        bulk_fetch.token_manager, "get_token_async", fake_get_token_async
+    )
+    numbers = ["3661357", "18752141.4", "ep18752141", "2"] * 5
+    results = fetch_extracts_sync(numbers, concurrency=3)
+    assert len(results) == len(numbers)
+    assert sorted(number for number, _ in results) == sorted(numbers)
+    assert peak[0] <= 3
+    assert sorted(fetched) == ["2", "EP18752141", "EP3661357"]
+    for number, extract in results:
+        if number == "18752141.4":
+            assert extract == fake_extract("application", "EP18752141")
+
+
+def test_fetcher_with_other_constituents_is_rejected():
+    fetcher = bulk_fetch.CoalescingFetcher(constituents=("biblio", "events"))
+    with pytest.raises(ValueError):
+        asyncio.run(
+            anext(
+                bulk_fetch.fetch_extracts(
+                    ["2"], constituents=("biblio",), fetcher=fetcher
+                )
+            )
+        )
+
+
+def test_stopping_early_does_not_wait_for_requests(monkeypatch):
+    release = threading.Event()
+
+    def slow_retrieve_one_extract(number_type, number, constituents):
+        release.wait(5)
+        return fake_extract(number_type, number)
+
+    async def fake_get_token_async():
+        return "token"
+
+    monkeypatch.setattr(bulk_fetch, "retrieve_one_extract", slow_retrieve_one_extract)
+    monkeypatch.setattr(bulk_fetch, "ensure_pool_size", lambda pool_size: None)
+    monkeypatch.setattr(
+        bulk_fetch.token_manager, "get_token_async", fake_get_token_async
+    )
+
+    async def stop_early():
+        start = time.monotonic()
+        fetch = bulk_fetch.fetch_extracts(["1", "2", "3"], concurrency=3)
+        with pytest.raises(asyncio.TimeoutError):  # cancels the fetch
+            await asyncio.wait_for(anext(fetch), 0.1)
+        await fetch.aclose()
+        return time.monotonic() - start
+
+    try:
+        assert asyncio.run(stop_early()) < 1
+    finally:
+        release.set()
@@ -0,0 +1,51 @@
+import gzip
+import json
+from helpers.capture_archive import CaptureArchive
+
+
+def test_capture_read_and_replay(tmp_path):
+    path = tmp_path / "capture.jsonl.gz"
+    archive = CaptureArchive(path)
+    archive.capture("EP3661357", b'{"version": 1}', url="http://example/EP3661357")
+    archive.capture("EP1505543", '{"title": "Café"}'.encode("utf-8"))
+    archive.capture("EP3661357", b'{"version": 2}')
+    archive.flush()
+    assert sorted(archive.numbers()) == ["EP1505543", "EP3661357"]
+    assert archive.read_extract("EP3661357") == {"version": 2}
+    assert archive.read_extract("EP3661357", which=0) == {"version": 1}
+    assert archive.read("EP3661357", which=0)["url"] == "http://example/EP3661357"
+    assert archive.read_extract("EP1505543") == {"title": "Café"}
+    assert [record["number"] for record in archive.replay()] == [
+        "EP3661357",
+        "EP1505543",
+        "EP3661357",
+    ]
+    archive.close()
+    with gzip.open(path, "rt", encoding="utf-8") as f:  # readable as plain gzipped JSONL
+        assert len([json.loads(line) for line in f]) == 3
+
+
+def test_archive_reopens_with_index(tmp_path):
+    path = tmp_path / "capture.jsonl.gz"
+    archive = CaptureArchive(path)
+    archive.capture("EP3009828", b"{}")
+    archive.close()
+    reopened = CaptureArchive(path)
+    reopened.capture("EP2422227", b"[]")
+    reopened.flush()
+    assert reopened.read_extract("EP3009828") == {}
+    assert reopened.read_extract("EP2422227") == []
+    reopened.close()
+
+
+def test_binary_body_and_failed_record_do_not_stop_the_writer(tmp_path, caplog):
+    archive = CaptureArchive(tmp_path / "capture.jsonl.gz")
+    archive.capture("EP3661357", b"\xff\xfe not utf-8")
+    archive.capture(object(), b"{}")  # number cannot be written as JSON
+    archive.capture("EP1505543", b"{}")
+    archive.flush()
+    assert archive.read("EP3661357")["body_encoding"] == "base64"
+    assert archive.read_body("EP3661357") == b"\xff\xfe not utf-8"
+    assert archive.read_extract("EP1505543") == {}
+    assert "Could not capture" in caplog.text
+    archive.close()
@@ -0,0 +1,142 @@
+import threading
+import time
+import pytest
+from helpers.coalescing import CoalescingFetcher
+
+
+def make_extract(application_number, publication_number):
+    return {
+        "ops:world-patent-data": {
+            "ops:register-search": {
+                "reg:register-documents": {
+                    "reg:register-document": {
+                        "reg:bibliographic-data": {
+                            "reg:application-reference": {
+                                "reg:document-id": {
+                                    "reg:country": {"$": "EP"},
+                                    "reg:doc-number": {"$": application_number},
+                                }
+                            },
+                            "reg:publication-reference": {
+                                "reg:document-id": {
+                                    "reg:country": {"$": "EP"},
+                                    "reg:doc-number": {"$": publication_number},
+                                }
+                            },
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+
+def test_aliases_resolve_without_fetching():
+    calls = []
+
+    def fake_fetch(number_type, number, constituents):
+        calls.append(number)
+        return make_extract("18752141", "3661357")
+
+    fetcher = CoalescingFetcher(fake_fetch)
+    first = fetcher.fetch("ep18752141")
+    for number in ["EP3661357", "18752141.4", "3661357", "EP18752141.4"]:
+        assert fetcher.fetch(number) is first
+    assert calls == ["EP18752141"]
+    assert fetcher.aliases_of("3661357") == {"EP18752141", "EP3661357"}
+
+
+def test_concurrent_duplicates_share_one_request():
+    calls = []
+
+    def slow_fetch(number_type, number, constituents):
+        calls.append(number)
+        time.sleep(0.05)
+        return make_extract("18752141", "3661357")
+
+    fetcher = CoalescingFetcher(slow_fetch)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(fetcher.fetch("18752141.4")))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == ["EP18752141"]
+    assert len(results) == 5
+    assert fetcher.network_fetches == 1
+    assert fetcher.coalesced == 4
+
+
+def test_invalid_numbers_are_not_kept():
+    calls = []
+
+    def fake_fetch(number_type, number, constituents):
+        calls.append(number)
+        return {"invalid_number": number}
+
+    fetcher = CoalescingFetcher(fake_fetch)
+    assert fetcher.fetch("31650114") == {"invalid_number": "EP31650114"}
+    fetcher.fetch("31650114")
+    assert calls == ["EP31650114", "EP31650114"]
+
+
+def test_errors_are_not_kept():
+    calls = []
+
+    def failing_fetch(number_type, number, constituents):
+        calls.append(number)
+        if len(calls) == 1:
+            raise ConnectionError("reset")
+        return make_extract("18752141", "3661357")
+
+    fetcher = CoalescingFetcher(failing_fetch)
+    with pytest.raises(ConnectionError):
+        fetcher.fetch("18752141")
+    assert fetcher.fetch("18752141") == make_extract("18752141", "3661357")
+    assert calls == ["EP18752141", "EP18752141"]
+
+
+def test_eviction_drops_aliases():
+    calls = []
+
+    def fake_fetch(number_type, number, constituents):
+        calls.append(number)
+        if number == "EP18752141":
+            return make_extract("18752141", "3661357")
+        return make_extract("19000001", "3700001")
+
+    fetcher = CoalescingFetcher(fake_fetch, max_cases=1)
+    fetcher.fetch("18752141")
+    fetcher.fetch("19000001")  # evicts EP18752141 with its aliases
+    assert fetcher.aliases_of("EP3661357") == set()
+    assert fetcher.aliases_of("EP3700001") == {"EP19000001", "EP3700001"}
+    fetcher.fetch("EP3661357")
+    assert calls == ["EP18752141", "EP19000001", "EP3661357"]
+
+
+def test_unreadable_extract_is_returned_without_blocking_later_lookups():
+    calls = []
+
+    def fake_fetch(number_type, number, constituents):
+        calls.append(number)
+        extract = make_extract("18752141", "3661357")
+        document = extract["ops:world-patent-data"]["ops:register-search"][
+            "reg:register-documents"
+        ]["reg:register-document"]
+        del document["reg:bibliographic-data"]["reg:application-reference"][
+            "reg:document-id"
+        ]["reg:country"]
+        return extract
+
+    fetcher = CoalescingFetcher(fake_fetch)
+    first = fetcher.fetch("18752141")
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fetcher.fetch("18752141")))
+    thread.start()
+    thread.join(2)
+    assert not thread.is_alive()
+    assert result == [first]
+    assert calls == ["EP18752141", "EP18752141"]
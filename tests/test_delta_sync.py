@@ -0,0 +1,129 @@
+from datetime import date
+from helpers import delta_sync, register_access_download
+from helpers.delta_sync import changed_cases_query, load_watermarks, save_watermarks
+from helpers.extract_cache import ExtractCache, cache_key
+from helpers.register_access_download import SearchTruncatedError
+
+
+def search_document(application_number, country="EP"):
+    return {
+        "reg:bibliographic-data": {
+            "reg:application-reference": {
+                "reg:document-id": {
+                    "reg:country": {"$": country},
+                    "reg:doc-number": {"$": application_number},
+                }
+            }
+        }
+    }
+
+
+def test_changed_cases_query():
+    assert changed_cases_query("pa", "ACME", None, date(2024, 10, 18)) == 'pa="ACME"'
+    assert (
+        changed_cases_query("re", "ACME", date(2024, 10, 11), date(2024, 10, 18))
+        == 're="ACME" and pd within "20241011 20241018"'
+    )
+    assert (
+        changed_cases_query(
+            "pa", '"wilhelmstal" Ernst & Sohn', None, date(2024, 10, 18)
+        )
+        == 'pa="wilhelmstal Ernst & Sohn"'
+    )
+
+
+def test_delta_sync_fetches_only_changed_cases(tmp_path, monkeypatch):
+    queries, fetched = [], []
+
+    def fake_search_register(query, strict=False):
+        queries.append(query)
+        return (
+            [search_document("18752141")]
+            if "within" in query
+            else [
+                search_document("18752141"),
+                search_document("18152360"),
+                search_document("2018051234", country="WO"),  # no EP reference
+            ]
+        )
+
+    def fake_fetch_extracts_sync(numbers, concurrency, constituents):
+        fetched.append(list(numbers))
+        return [(number, {"number": number}) for number in numbers]
+
+    cache = ExtractCache(tmp_path / "cache.sqlite")
+    cache.put(cache_key("application", "EP18752141"), b"{}")
+    monkeypatch.setattr(register_access_download, "extract_cache", cache)
+    monkeypatch.setattr(delta_sync, "search_register", fake_search_register)
+    monkeypatch.setattr(delta_sync, "fetch_extracts_sync", fake_fetch_extracts_sync)
+    watermark_path = tmp_path / "watermark.json"
+
+    first = delta_sync.delta_sync(
+        ["ACME"], [], watermark_path, until=date(2024, 10, 11)
+    )
+    assert queries == ['pa="ACME"']
+    assert sorted(first.extracts) == ["EP18152360", "EP18752141"]
+    assert load_watermarks(watermark_path) == {"pa=ACME": date(2024, 10, 11)}
+
+    second = delta_sync.delta_sync(
+        ["ACME"], ["Smith & Co"], watermark_path, until=date(2024, 10, 18)
+    )
+    assert queries[1:] == [
+        'pa="ACME" and pd within "20241011 20241018"',
+        're="Smith & Co"',
+    ]
+    assert second.since == {"pa=ACME": date(2024, 10, 11), "re=Smith & Co": None}
+    assert len(cache) == 0  # the stale copy of the changed case was dropped
+    assert load_watermarks(watermark_path) == {
+        "pa=ACME": date(2024, 10, 18),
+        "re=Smith & Co": date(2024, 10, 18),
+    }
+    cache.close()
+
+
+def test_delta_sync_splits_truncated_searches(tmp_path, monkeypatch):
+    queries = []
+
+    def fake_search_register(query, strict=False):
+        # more than 3 days, or no date range at all, is too many cases for OPS
+        queries.append(query)
+        if "within" in query:
+            since, until = query[-18:-1].split()
+            if int(until) - int(since) < 3:
+                return [search_document(since)]
+        if strict:
+            raise SearchTruncatedError(query, 5000)
+        return [search_document("18752141")]
+
+    monkeypatch.setattr(register_access_download, "extract_cache", None)
+    monkeypatch.setattr(delta_sync, "search_register", fake_search_register)
+    monkeypatch.setattr(
+        delta_sync,
+        "fetch_extracts_sync",
+        lambda numbers, concurrency, constituents: [(n, {}) for n in numbers],
+    )
+    watermark_path = tmp_path / "watermark.json"
+
+    first = delta_sync.delta_sync(["ACME"], [], watermark_path, date(2024, 10, 1))
+    assert first.truncated == ["pa=ACME"] and list(first.extracts) == ["EP18752141"]
+    assert load_watermarks(watermark_path) == {}
+
+    save_watermarks(watermark_path, {"pa=ACME": date(2024, 10, 1)})
+    second = delta_sync.delta_sync(["ACME"], [], watermark_path, date(2024, 10, 8))
+    assert second.truncated == []
+    assert sorted(second.extracts) == [
+        "EP20241001",
+        "EP20241003",
+        "EP20241005",
+        "EP20241007",
+    ]
+    assert [query[-19:] for query in queries[2:]] == [
+        '"20241001 20241008"',
+        '"20241001 20241004"',
+        '"20241001 20241002"',
+        '"20241003 20241004"',
+        '"20241005 20241008"',
+        '"20241005 20241006"',
+        '"20241007 20241008"',
+    ]
+    assert load_watermarks(watermark_path) == {"pa=ACME": date(2024, 10, 8)}
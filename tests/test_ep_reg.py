@@ -1,12 +1,22 @@
 import pytest
 import json
 from datetime import datetime
+import helpers.register_access_download as register_access_download
 from helpers.register_access_download import (
+    OPSThrottlingError,
+    SearchTruncatedError,
+    ThrottleScheduler,
+    TokenManager,
     get_access_token,
+    parse_throttling_control,
+    retrieve_many_extracts,
+    cql_phrase,
+    search_register,
     number_normalization,
     retrieve_one_extract,
 )
 from helpers.register_parser_functions import (
+    split_register_document,
     get_application_numbers,
     get_filing_date,
     get_publication_number_and_date,
@@ -17,10 +27,27 @@ from helpers.register_parser_functions import (
     get_all_applicants,
     get_all_inventors,
     get_title,
+    extract_patent,
+    LazyPatent,
+    Patent,
 )
+from helpers.party_registry import PartyRegistry
+from helpers.ops_stand_in import load_recorded_extract
 from reg_from_appln_no import get_full_patent_data
 
 
+@pytest.fixture(scope="module", autouse=True)
+def register_cache():
+    """
+    Keeps every extract downloaded by these tests, so only the first run hits the live service
+    """
+    cache = register_access_download.configure_cache(
+        ".pytest_cache/register_extracts.sqlite", ttl=None
+    )
+    yield cache
+    register_access_download.configure_cache(None)
+
+
 @pytest.fixture(
     scope="module",
     params=[
@@ -82,9 +109,7 @@ def register_data(request):
     number = request.param
     token = get_access_token()
     number_type, number = number_normalization(number)
-    retrieve_one_extract(number_type, number, token)
-    with open("output_files/test_register_extract.json", "r") as f:
-        return json.loads(f.read())
+    return retrieve_one_extract(number_type, number, token)
 
 
 def test_number_normalizer(number):
@@ -107,6 +132,184 @@ def test_get_access_token():
     assert len(token) > 0
 
 
+def test_token_manager_reuses_and_refreshes(monkeypatch):
+    """
+    tests that the token is fetched once, reused while fresh and replaced when stale or refreshed
+    """
+    calls = []
+
+    def fake_request_access_token():
+        calls.append(1)
+        return {"access_token": f"token{len(calls)}", "expires_in": "1199"}
+
+    monkeypatch.setattr(
+        register_access_download, "request_access_token", fake_request_access_token
+    )
+    manager = TokenManager(refresh_margin=60)
+    assert manager.get_token() == "token1"
+    assert manager.get_token() == "token1"
+    assert len(calls) == 1
+    assert manager.refresh(stale_token="token1") == "token2"
+    assert manager.refresh(stale_token="token1") == "token2"  # already replaced
+    assert len(calls) == 2
+    manager._expires_at = 0.0  # pretend the token is about to expire
+    assert manager.get_token() == "token3"
+
+
+def test_parse_throttling_control():
+    header = "busy (images=green:200, inpadoc=green:60, other=yellow:1000, retrieval=green:200, search=black:30)"
+    system_state, services = parse_throttling_control(header)
+    assert system_state == "busy"
+    assert services["other"] == ("yellow", 1000)
+    assert services["search"] == ("black", 30)
+    assert len(services) == 5
+
+
+def test_throttle_scheduler_adjusts_rate():
+    scheduler = ThrottleScheduler()
+    scheduler.update(
+        "other",
+        {
+            "X-Throttling-Control": "idle (other=green:600, search=black:30)",
+            "X-IndividualQuotaPerHour-Used": "123456",
+        },
+    )
+    assert scheduler._interval["other"] == 0.1
+    assert scheduler._next_slot["search"] > 0  # paused after a black light
+    assert scheduler.quota_used_per_hour == 123456
+
+
+def test_throttled_response_is_not_an_invalid_number(monkeypatch):
+    """
+    tests that a quota rejection raises instead of being reported as {"invalid_number": ...}
+    """
+
+    class FakeResponse:
+        status_code = 403
+        headers = {"X-Rejection-Reason": "IndividualQuotaPerHour"}
+        content = b""
+
+    monkeypatch.setattr(register_access_download, "extract_cache", None)
+    monkeypatch.setattr(
+        register_access_download, "ops_request", lambda *args, **kwargs: FakeResponse()
+    )
+    with pytest.raises(OPSThrottlingError):
+        retrieve_one_extract("publication", "EP3661357", token="token")
+
+
+def test_search_register_walks_all_pages(monkeypatch):
+    """
+    tests that every document is yielded once across pages and the right ranges are requested
+    """
+    requested_ranges = []
+
+    def fake_fetch_search_page(query, begin, page_size, token):
+        requested_ranges.append(begin)
+        end = min(begin + page_size - 1, 7)
+        return 7, [{"@id": str(i)} for i in range(begin, end + 1)]
+
+    monkeypatch.setattr(
+        register_access_download, "fetch_search_page", fake_fetch_search_page
+    )
+    documents = list(search_register('pa="Magna"', page_size=3, prefetch=1))
+    assert [document["@id"] for document in documents] == [str(i) for i in range(1, 8)]
+    assert requested_ranges == [1, 4, 7]
+
+
+def test_retrieve_many_extracts_splits_batches(monkeypatch):
+    """
+    tests that numbers are packed into "or" queries, split back per number and that
+    unresolved numbers fall back to single lookups
+    """
+
+    def make_document(application_number, publication_number):
+        return {
+            "reg:bibliographic-data": {
+                "reg:application-reference": {
+                    "reg:document-id": {
+                        "reg:country": {"$": "EP"},
+                        "reg:doc-number": {"$": application_number},
+                    }
+                },
+                "reg:publication-reference": [
+                    {
+                        "reg:document-id": {
+                            "reg:country": {"$": "WO"},
+                            "reg:doc-number": {"$": "2019025638"},
+                        }
+                    },
+                    {
+                        "reg:document-id": {
+                            "reg:country": {"$": "EP"},
+                            "reg:doc-number": {"$": publication_number},
+                        }
+                    },
+                ],
+            }
+        }
+
+    queries = []
+
+    def fake_search_register(query, token):
+        queries.append(query)
+        yield make_document("18752141", "3661357")
+        yield make_document("04018554", "1505543")
+
+    monkeypatch.setattr(register_access_download, "extract_cache", None)
+    monkeypatch.setattr(
+        register_access_download, "search_register", fake_search_register
+    )
+    monkeypatch.setattr(
+        register_access_download,
+        "retrieve_one_extract",
+        lambda number_type, number, token: {"invalid_number": number},
+    )
+    numbers = [
+        number_normalization(number)
+        for number in ["3661357", "18752141.4", "1505543", "31650114", "2"]
+    ]
+    extracts = retrieve_many_extracts(numbers, batch_size=4)
+    assert queries == ["pn=EP3661357 or ap=EP18752141 or pn=EP1505543 or ap=EP31650114"]
+    assert extracts["EP3661357"] == extracts["EP18752141"]
+    assert (
+        extracts["EP1505543"]["ops:world-patent-data"]["ops:register-search"][
+            "@total-result-count"
+        ]
+        == "1"
+    )
+    assert extracts["EP31650114"] == {"invalid_number": "EP31650114"}
+    assert extracts["2"] == {"invalid_number": "2"}
+
+
+def test_search_register_stops_at_result_window(monkeypatch, caplog):
+    """
+    tests that no page beyond the OPS result window is requested and the truncation is logged
+    """
+    requested_ranges = []
+
+    def fake_fetch_search_page(query, begin, page_size, token):
+        requested_ranges.append((begin, begin + page_size - 1))
+        return 10000, [{"@id": str(i)} for i in range(begin, begin + page_size)]
+
+    monkeypatch.setattr(
+        register_access_download, "fetch_search_page", fake_fetch_search_page
+    )
+    monkeypatch.setattr(register_access_download, "SEARCH_RESULT_WINDOW", 7)
+    documents = list(search_register('pa="Magna"', page_size=3, prefetch=1))
+    assert len(documents) == 7
+    assert requested_ranges == [(1, 3), (4, 6), (7, 7)]
+    assert "matches 10000 cases" in caplog.text
+    with pytest.raises(SearchTruncatedError):
+        next(search_register('pa="Magna"', strict=True))
+
+
+def test_cql_phrase_drops_inner_quotes():
+    assert (
+        cql_phrase('"wilhelmstal" Ernst & Sohn GmbH & Co KG')
+        == '"wilhelmstal Ernst & Sohn GmbH & Co KG"'
+    )
+
+
 def test_retrieve_one_extract(number):
     """
     tests a series of valid numbers for the same case and verifies that register extract is retrieved correctly
@@ -151,6 +354,48 @@ def test_retrieve_one_extract(number):
         assert biblio["@id"] in ["EP18752141P", "EP00650114P", "EP04018554P"]
 
 
+def test_split_register_document():
+    extract = {
+        "ops:world-patent-data": {
+            "ops:register-search": {
+                "reg:register-documents": {
+                    "reg:register-document": {
+                        "reg:bibliographic-data": {"@id": "EP18752141P"},
+                        "reg:events-data": {
+                            "reg:dossier-event": {"@id": "EVT_1"}
+                        },  # single event, not a list
+                        "reg:procedural-data": {
+                            "reg:procedural-step": [
+                                {"@id": "STEP_1"},
+                                {"@id": "STEP_2"},
+                            ]
+                        },
+                    }
+                }
+            }
+        }
+    }
+    sections = split_register_document(extract)
+    assert sections.biblio == {"@id": "EP18752141P"}
+    assert sections.events == [{"@id": "EVT_1"}]
+    assert len(sections.procedural_steps) == 2
+    assert sections.statuses == []
+
+
+def test_retrieve_constituents_in_one_request(number):
+    number_type, normalized_number = number_normalization(number)
+    if number_type == "unknown":
+        return
+    extract = retrieve_one_extract(
+        number_type, normalized_number, constituents=("biblio", "events")
+    )
+    if "invalid_number" in extract:
+        return
+    sections = split_register_document(extract)
+    assert sections.biblio["@id"] in ["EP18752141P", "EP00650114P", "EP04018554P"]
+    assert len(sections.events) > 0
+
+
 def test_get_application_numbers(register_data):
     biblio = register_data["ops:world-patent-data"]["ops:register-search"][
         "reg:register-documents"
@@ -347,3 +592,60 @@ def test_get_all_info_one_patent(number_and_ref):
             with open(r"documentation/repr_one_patent_obj.txt", "r") as f:
                 intended_repr = f.read()
             assert repr(patent_obj) == intended_repr
+
+
+@pytest.mark.parametrize(
+    "recorded_extract",
+    ["output_files/sample_extract.json", "output_files/test_register_extract.json"],
+)
+def test_extract_patent_matches_getters(recorded_extract):
+    biblio = split_register_document(load_recorded_extract(recorded_extract)).biblio
+    patent = extract_patent(biblio)
+    application_numbers = get_application_numbers(biblio)
+    assert patent.ep_application_number == application_numbers["EP"]
+    assert patent.wo_application_number == application_numbers.get("WO", "")
+    publication_data = get_publication_number_and_date(biblio)
+    assert patent.ep_publication_number == publication_data["EP"]["number"]
+    assert patent.ep_publication_date == publication_data["EP"]["date"]
+    assert patent.filing_date == get_filing_date(biblio)
+    assert patent.grant_date == get_grant_date(biblio)
+    assert patent.is_granted == is_granted(biblio)
+    assert patent.priority == get_priority(biblio)
+    assert patent.designated_states == get_designated_states(biblio)
+    assert patent.applicants == get_all_applicants(biblio)
+    assert patent.inventors == get_all_inventors(biblio)
+    assert patent.title == get_title(biblio)
+
+
+def test_lazy_patent_parses_only_what_is_read():
+    biblio = split_register_document(
+        load_recorded_extract("output_files/test_register_extract.json")
+    ).biblio
+    registry = PartyRegistry()
+    lazy = LazyPatent(biblio, "ref1", registry)
+    assert lazy.grant_date == get_grant_date(biblio)
+    assert lazy.is_granted == is_granted(biblio)
+    assert len(registry) == 0  # parties not read, so not registered
+    lazy.title = "set explicitly"
+    assert lazy.title == "set explicitly"
+    eager = extract_patent(biblio, registry=registry)
+    assert lazy.applicants == eager.applicants
+    assert lazy.applicants[0] is eager.applicants[0]
+    assert lazy.priority == eager.priority
+    assert lazy.ref == "ref1"
+    assert lazy.publication_number == ""
+
+
+def test_lazy_patent_equals_eager_patent():
+    biblio = split_register_document(
+        load_recorded_extract("output_files/test_register_extract.json")
+    ).biblio
+    registry = PartyRegistry()
+    lazy = LazyPatent(biblio, registry=registry)
+    eager = extract_patent(biblio, registry=registry)
+    assert lazy == eager
+    assert eager == lazy
+    assert repr(lazy) == repr(eager)
+    assert type(lazy.to_patent()) is Patent
+    eager.title = "changed"
+    assert lazy != eager
@@ -1,11 +1,17 @@
 import pytest
+from datetime import datetime
 from openpyxl import Workbook, load_workbook
-from helpers.excel_in import extract_excel_data
+from helpers import excel_out
+from helpers.excel_in import extract_excel_data, iter_case_list
 from helpers.excel_out import (
+    case_row,
+    cached_template,
+    export_cases,
     get_excel_from_template,
     initialize_wb,
     populate_excel_one_case,
 )
+from helpers.register_parser_functions import Party, Patent, Priority
 from reg_from_appln_no import get_full_patent_data
 
 
@@ -31,3 +37,179 @@ def test_create_excel():
     wb = get_excel_from_template()
     wb = initialize_wb(wb)
     populate_excel_one_case(wb, get_full_patent_data("18752141", "testing1"))
+
+
+def make_patent(n, priorities=1):
+    return Patent(
+        ref=f"ref{n}",
+        title=f"Title {n}",
+        ep_application_number=f"1875214{n}.4",
+        filing_date=datetime(2018, 8, 6),
+        priority=[
+            Priority("US", datetime(2017, 8, 7 - p), f"62/54218{p}")
+            for p in range(priorities)
+        ],
+        applicants=[Party(company_name="ACME")],
+        inventors=[
+            Party(last_name="DOE"),
+            Party(last_name="ROE"),
+            Party(last_name="POE"),
+        ],
+        ep_publication_number="3661357",
+        ep_publication_date="20200610",
+    )
+
+
+def test_case_row_sorts_priorities_and_uses_register_publication():
+    row = case_row(make_patent(1, priorities=2))
+    assert row["J"] == "06/08/2017"  # earliest priority first
+    assert row["AA"].startswith("Additional priorities:07/08/2017")
+    assert (row["M"], row["N"]) == ("10/06/2020", "3661357")
+    assert row["AB"].startswith("Co-Inventors: ")
+    assert "Q" not in row  # not granted
+
+
+def test_export_cases_saves_once_with_checkpoint(tmp_path, monkeypatch):
+    cached_template()  # saving the cached template copy is not part of the export
+    saves = []
+    original_save = Workbook.save
+    monkeypatch.setattr(
+        Workbook, "save", lambda wb, path: saves.append(path) or original_save(wb, path)
+    )
+    output_path = tmp_path / "Patricia_import.xlsx"
+    count = export_cases(
+        (make_patent(n) for n in range(5)), output_path, checkpoint_every=2
+    )
+    assert count == 5
+    assert saves == [output_path]
+    assert not (tmp_path / "Patricia_import.xlsx.checkpoint.csv").exists()
+    sheet = load_workbook(output_path)["CASE_DATA"]
+    assert sheet["A1"].value == "Old_Case_No"
+    assert [sheet[f"A{row}"].value for row in range(2, 7)] == [
+        f"ref{n}" for n in range(5)
+    ]
+    assert sheet["I6"].value == "18752144.4"
+
+
+def test_export_cases_writes_unique_parties_and_designated_states(tmp_path):
+    acme = Party(
+        is_legal_entity=True,
+        company_name="ACME",
+        address_1="1 Main St",
+        address_2="Springfield",
+    )
+    patents = [make_patent(n) for n in range(2)]
+    for patent in patents:
+        patent.applicants = [acme]  # shared, as after deduplication
+        patent.designated_states = ["DE", "FR", "GB"]
+    output_path = tmp_path / "Patricia_import.xlsx"
+    export_cases(patents, output_path)
+    wb = load_workbook(output_path)
+    names = list(wb["NAME_DATA"].iter_rows(min_row=2, values_only=True))
+    assert len(names) == 1 + 2 * 3  # ACME once, three inventors per case
+    assert names[0][:8] == (
+        acme.unique_id,
+        "TRUE",
+        None,
+        None,
+        None,
+        "ACME",
+        None,
+        "1 Main St",
+    )
+    assert (names[0][12], names[0][20]) == ("Springfield", "FALSE")
+    assert names[1][4] == "DOE"
+    states = list(wb["DESIGNATED_STATES"].iter_rows(min_row=2, values_only=True))
+    assert states[:3] == [("ref0", "DE"), ("ref0", "FR"), ("ref0", "GB")]
+    assert len(states) == 6
+
+
+def test_interrupted_export_leaves_checkpoint(tmp_path):
+    def patents():
+        for n in range(3):
+            yield make_patent(n)
+        raise RuntimeError("fetch failed")
+
+    output_path = tmp_path / "Patricia_import.xlsx"
+    with pytest.raises(RuntimeError):
+        export_cases(patents(), output_path, checkpoint_every=2)
+    checkpoint = (tmp_path / "Patricia_import.xlsx.checkpoint.csv").read_text()
+    assert [line.split(",")[0] for line in checkpoint.splitlines()] == ["ref0", "ref1"]
+    assert not output_path.exists()
+
+
+def test_template_is_parsed_once(tmp_path, monkeypatch):
+    template_path = tmp_path / "template.xlsx"
+    template_path.write_bytes(excel_out.TEMPLATE_PATH.read_bytes())
+    initialized = []
+    parsed = []
+    original_load_workbook = excel_out.load_workbook
+    monkeypatch.setattr(
+        excel_out,
+        "initialize_wb",
+        lambda wb: initialized.append(wb) or initialize_wb(wb),
+    )
+    monkeypatch.setattr(
+        excel_out,
+        "load_workbook",
+        lambda *args, **kwargs: parsed.append(args)
+        or original_load_workbook(*args, **kwargs),
+    )
+    first = get_excel_from_template(template_path)
+    second = get_excel_from_template(template_path)
+    assert len(initialized) == len(parsed) == 1
+    assert first["CASE_DATA"]["A1"].value == "Old_Case_No"
+    assert first["CASE_DATA"].max_row == 1  # header only
+    first["CASE_DATA"]["A2"].value = "ref1"
+    assert second["CASE_DATA"]["A2"].value is None
+    export_workbook = excel_out.new_export_workbook(template_path)
+    assert export_workbook.sheetnames == first.sheetnames
+    assert len(initialized) == 1
+    for worksheet in export_workbook.worksheets:
+        worksheet.close()
+
+
+def test_workbooks_keep_the_template_formatting(tmp_path):
+    output_path = tmp_path / "Patricia_import.xlsx"
+    export_cases([make_patent(0)], output_path)
+    get_excel_from_template().save(tmp_path / "from_template.xlsx")
+    for path in (output_path, tmp_path / "from_template.xlsx"):
+        sheet = load_workbook(path)["CASE_DATA"]
+        hidden = [
+            letter
+            for letter, dimension in sheet.column_dimensions.items()
+            if dimension.hidden
+        ]
+        assert hidden == ["T", "AC", "AD"]
+        assert sheet.column_dimensions["B"].number_format == "@"
+        assert sheet["B1"].number_format == "@"
+        assert sheet["A1"].fill.fgColor.rgb == "FFFFC000"
+        assert sheet["A1"].font.name == "MS Sans Serif"
+
+
+def test_iter_case_list_matches_extract_excel_data():
+    path = "input_files/magic_leap_cases.xlsx"
+    assert list(iter_case_list(path)) == extract_excel_data(load_workbook(path))
+
+
+def test_iter_case_list_reads_csv(tmp_path):
+    path = tmp_path / "cases.csv"
+    path.write_text(
+        "ref,number\nPT06664EP,18744218.1\n,\nPT06665EP,EP3661357\n", encoding="utf-8"
+    )
+    cases = iter_case_list(path)
+    assert next(cases) == ("PT06664EP", "18744218.1")
+    assert list(cases) == [("PT06665EP", "EP3661357")]
+
+
+def test_iter_case_list_reads_parquet(tmp_path):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "cases.parquet"
+    pd.DataFrame(
+        {"ref": ["PT06664EP", "PT06665EP"], "number": ["18744218.1", "EP3661357"]}
+    ).to_parquet(path)
+    assert list(iter_case_list(path, chunk_size=1)) == [
+        ("PT06664EP", "18744218.1"),
+        ("PT06665EP", "EP3661357"),
+    ]
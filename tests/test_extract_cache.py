@@ -0,0 +1,52 @@
+import pytest
+from helpers.extract_cache import ExtractCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ExtractCache(tmp_path / "extracts.sqlite", ttl=60, max_bytes=25)
+    yield cache
+    cache.close()
+
+
+def test_cache_key():
+    assert cache_key("publication", "EP3661357") == "publication/EP3661357/biblio"
+
+
+def test_put_and_get(cache):
+    cache.put("publication/EP3661357/biblio", b'{"a": 1}', etag='"abc"')
+    entry = cache.get("publication/EP3661357/biblio")
+    assert entry.content == b'{"a": 1}'
+    assert entry.etag == '"abc"'
+    assert entry.last_modified is None
+    assert cache.is_fresh(entry)
+    assert cache.get("publication/EP1505543/biblio") is None
+
+
+def test_stale_entry_and_touch(cache):
+    cache.put("application/EP18752141/biblio", b"{}")
+    entry = cache.get("application/EP18752141/biblio")
+    entry.fetched_at -= 61
+    assert not cache.is_fresh(entry)
+    cache.touch("application/EP18752141/biblio")
+    assert cache.is_fresh(cache.get("application/EP18752141/biblio"))
+
+
+def test_eviction_is_least_recently_used(cache):
+    cache.put("first", b"0123456789")
+    cache.put("second", b"0123456789")
+    cache.get("first")  # second is now the least recently used
+    cache.put("third", b"0123456789")
+    assert len(cache) == 2
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+
+
+def test_persists_between_instances(tmp_path):
+    path = tmp_path / "extracts.sqlite"
+    first = ExtractCache(path, ttl=None)
+    first.put("publication/EP1505543/biblio", b"{}")
+    first.close()
+    second = ExtractCache(path, ttl=None)
+    assert second.get("publication/EP1505543/biblio").content == b"{}"
+    second.close()
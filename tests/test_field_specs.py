@@ -0,0 +1,144 @@
+import json
+import pytest
+from datetime import datetime
+from helpers.field_specs import (
+    EACH,
+    FIRST,
+    MISSING,
+    FieldSpec,
+    compile_fields,
+    compile_path,
+    parse_date,
+    split_name,
+)
+from helpers.ops_stand_in import load_recorded_extract
+from helpers.register_parser_functions import (
+    APPLICANT_FIELDS,
+    INVENTOR_FIELDS,
+    PRIORITY_FIELDS,
+    Party,
+    Priority,
+    as_list,
+    fill_applicant,
+    fill_inventor,
+    fill_priority,
+    latest_parties,
+    split_register_document,
+)
+
+
+class Target:
+    pass
+
+
+def test_compile_path_handles_lists_and_missing_keys():
+    designated_states = compile_path(
+        (FIRST, "reg:designation-pct", "reg:regional", "reg:country", EACH, "$")
+    )
+    single = {"reg:designation-pct": {"reg:regional": {"reg:country": {"$": "DE"}}}}
+    republished = [
+        {
+            "reg:designation-pct": {
+                "reg:regional": {"reg:country": [{"$": "DE"}, {"$": "FR"}]}
+            }
+        },
+        single,
+    ]
+    assert designated_states(single) == ["DE"]
+    assert designated_states(republished) == ["DE", "FR"]
+    assert designated_states({}) is MISSING
+
+
+def test_compile_fields_converts_and_keeps_defaults():
+    fill = compile_fields(
+        [
+            FieldSpec("sequence", ("@sequence",), int),
+            FieldSpec(("last_name", "first_name"), ("name", "$"), split_name),
+            FieldSpec("date", ("date", "$"), parse_date),
+            FieldSpec("note", ("note", "$"), required=False),
+        ]
+    )
+    target = Target()
+    target.note = "default"
+    fill(
+        {"@sequence": "2", "name": {"$": "SMITH, John"}, "date": {"$": "20180806"}},
+        target,
+    )
+    assert target.sequence == 2
+    assert (target.last_name, target.first_name) == ("SMITH", " John")
+    assert target.date == datetime(2018, 8, 6)
+    assert target.note == "default"
+    with pytest.raises(KeyError, match="sequence"):
+        fill({"name": {"$": "SMITH, John"}, "date": {"$": "20180806"}}, Target())
+    with pytest.raises(KeyError) as error:
+        fill({"name": {}}, Target())
+    assert set(error.value.args[0].split(" not found")[0].split(", ")) == {
+        "sequence",
+        "last_name/first_name",
+        "date",
+    }
+
+
+def inventor_data():
+    return {
+        "@sequence": "1",
+        "reg:addressbook": {
+            "reg:name": {"$": "DOE, Jane"},
+            "reg:address": {
+                "reg:address-1": {"$": "1 Main Street"},
+                "reg:address-3": {"$": "Dublin"},
+                "reg:country": {"$": "IE"},
+            },
+        },
+    }
+
+
+def test_fill_inventor_reads_shared_address_fields():
+    party = fill_inventor(inventor_data(), Party())
+    assert party.inventor_sequence_number == 1
+    assert party.last_name == "DOE"
+    assert (party.address_1, party.address_2, party.address_3) == (
+        "1 Main Street",
+        "",
+        "Dublin",
+    )
+    assert party.address_country == "IE"
+
+
+def test_parsed_values_are_compact_and_shared():
+    # decoded separately, as two downloaded cases would be
+    first = fill_inventor(json.loads(json.dumps(inventor_data())), Party())
+    second = fill_inventor(json.loads(json.dumps(inventor_data())), Party())
+    assert not hasattr(first, "__dict__")
+    assert first.address_1 is second.address_1
+    assert first.address_country is second.address_country
+    assert parse_date("20180806") is parse_date("".join("20180806"))
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["output_files/test_register_extract.json", "output_files/sample_extract.json"],
+)
+def test_fill_functions_match_their_field_specs(path):
+    biblio = split_register_document(load_recorded_extract(path)).biblio
+    parties = biblio["reg:parties"]
+    priorities = biblio["reg:priority-claims"]
+    if isinstance(priorities, list):
+        priorities = priorities[0]
+    fillers = [
+        (fill_applicant, APPLICANT_FIELDS, Party, entry)
+        for entry in latest_parties(parties["reg:applicants"], "reg:applicant")
+    ]
+    fillers += [
+        (fill_inventor, INVENTOR_FIELDS, Party, entry)
+        for entry in latest_parties(parties["reg:inventors"], "reg:inventor")
+        + [inventor_data()]
+    ]
+    fillers += [
+        (fill_priority, PRIORITY_FIELDS, Priority, entry)
+        for entry in as_list(priorities["reg:priority-claim"])
+    ]
+    for fill, specs, target_class, entry in fillers:
+        assert fill(entry, target_class()) == compile_fields(specs)(
+            entry, target_class()
+        )
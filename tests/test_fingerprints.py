@@ -0,0 +1,110 @@
+import copy
+import pickle
+from dataclasses import asdict
+import pytest
+import reg_from_appln_no
+from helpers import fingerprints
+from helpers.fingerprints import FingerprintStore, biblio_fingerprint
+from helpers.ops_stand_in import load_recorded_extract
+from helpers.party_registry import PartyRegistry
+from helpers.register_parser_functions import extract_patent, get_register_document
+
+RECORDED_EXTRACT = load_recorded_extract("output_files/test_register_extract.json")
+
+
+def biblio_of(extract):
+    return get_register_document(extract)["reg:bibliographic-data"]
+
+
+def test_fingerprint_ignores_key_order_and_unused_sections():
+    biblio = biblio_of(RECORDED_EXTRACT)
+    reordered = dict(reversed(list(biblio.items())))
+    reordered["reg:classifications-ipcr"] = {"changed": True}
+    assert biblio_fingerprint(reordered) == biblio_fingerprint(biblio)
+    retitled = copy.deepcopy(biblio)
+    retitled["reg:invention-title"] = {"@lang": "en", "$": "New title"}
+    assert biblio_fingerprint(retitled) != biblio_fingerprint(biblio)
+
+
+def test_refresh_reports_changes_and_reuses_unchanged_cases(tmp_path, monkeypatch):
+    extracts = {"EP18752141": RECORDED_EXTRACT}
+    monkeypatch.setattr(
+        reg_from_appln_no,
+        "retrieve_one_extract",
+        lambda number_type, number: extracts.get(number, {"invalid_number": number}),
+    )
+    parsed = []
+
+    def counting_extract_patent(*args, **kwargs):
+        parsed.append(args)
+        return extract_patent(*args, **kwargs)
+
+    monkeypatch.setattr(reg_from_appln_no, "extract_patent", counting_extract_patent)
+    store = FingerprintStore(tmp_path / "fingerprints.sqlite")
+    cases = [("EP18752141", "ref1"), ("EP99999999", "ref2")]
+
+    first = reg_from_appln_no.refresh_patents(cases, store, PartyRegistry())
+    assert first.new == ["EP18752141"] and first.invalid == ["EP99999999"]
+    second = reg_from_appln_no.refresh_patents(cases, store, PartyRegistry())
+    assert second.unchanged == ["EP18752141"]
+    assert len(parsed) == 1
+    assert second.patents[0] == first.patents[0]
+    assert second.patents[0].applicants[0].unique_id == (
+        first.patents[0].applicants[0].unique_id
+    )
+
+    changed = copy.deepcopy(RECORDED_EXTRACT)
+    biblio_of(changed)["reg:invention-title"] = {"@lang": "en", "$": "New title"}
+    extracts["EP18752141"] = changed
+    third = reg_from_appln_no.refresh_patents(cases, store, PartyRegistry())
+    assert third.changed == ["EP18752141"]
+    assert third.patents[0].title == "New title"
+    store.close()
+
+
+def test_store_keeps_field_dicts_and_reports_unloadable_rows_as_changed(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(
+        reg_from_appln_no,
+        "retrieve_one_extract",
+        lambda number_type, number: RECORDED_EXTRACT,
+    )
+    store = FingerprintStore(tmp_path / "fingerprints.sqlite")
+    fingerprint = biblio_fingerprint(biblio_of(RECORDED_EXTRACT))
+    fields = asdict(extract_patent(biblio_of(RECORDED_EXTRACT)))
+    del fields["title"]  # as if title had been added to Patent after storing
+    store._conn.execute(
+        "INSERT INTO fingerprints VALUES (?, ?, ?, 0)",
+        ("EP18752141", fingerprint, pickle.dumps(fields)),
+    )
+    assert store.get("EP18752141").patent.title == ""
+
+    fields["removed_field"] = 1
+    store._conn.execute(
+        "UPDATE fingerprints SET patent = ? WHERE key = ?",
+        (pickle.dumps(fields), "EP18752141"),
+    )
+    assert store.get("EP18752141").patent is None
+    patent, status = reg_from_appln_no.fetch_patent(
+        "EP18752141", "ref1", fingerprints=store
+    )
+    assert status == "changed" and patent.title
+    assert store.get("EP18752141").patent == patent
+    store.close()
+
+
+def test_parser_version_is_part_of_the_fingerprint(monkeypatch):
+    biblio = biblio_of(RECORDED_EXTRACT)
+    before = biblio_fingerprint(biblio)
+    monkeypatch.setattr(fingerprints, "PARSER_VERSION", fingerprints.PARSER_VERSION + 1)
+    assert biblio_fingerprint(biblio) != before
+
+
+def test_lazy_patents_cannot_be_fingerprinted(tmp_path):
+    store = FingerprintStore(tmp_path / "fingerprints.sqlite")
+    with pytest.raises(ValueError):
+        reg_from_appln_no.fetch_patent(
+            "EP18752141", "ref1", lazy=True, fingerprints=store
+        )
+    store.close()
@@ -0,0 +1,21 @@
+import json
+import pytest
+from helpers import json_decoding
+from helpers.json_decoding import decode_json, encode_json, use_decoder
+
+
+@pytest.mark.parametrize("name", sorted(json_decoding.DECODERS))
+def test_decoders_agree_on_bytes(name):
+    body = json.dumps({"reg:name": {"$": "MÜLLER, Jürgen"}, "@sequence": "1"})
+    previous = json_decoding.decoder_name
+    use_decoder(name)
+    try:
+        assert decode_json(body.encode("utf-8")) == json.loads(body)
+        assert decode_json(encode_json(json.loads(body))) == json.loads(body)
+    finally:
+        use_decoder(previous)
+
+
+def test_unknown_decoder_is_rejected():
+    with pytest.raises(ValueError, match="not available"):
+        use_decoder("simdjson")
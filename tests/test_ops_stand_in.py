@@ -0,0 +1,117 @@
+import copy
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+import pytest
+from helpers.ops_stand_in import OPSStandIn, StandInConfig, load_recorded_extract
+from helpers.register_parser_functions import (
+    as_list,
+    document_numbers,
+    get_register_document,
+)
+
+
+@pytest.fixture
+def stand_in():
+    with OPSStandIn(config=StandInConfig(seed=1)) as stand_in:
+        yield stand_in
+
+
+def get_token(base_url: str) -> str:
+    request = urllib.request.Request(
+        f"{base_url}/3.2/auth/accesstoken", data=b"grant_type=client_credentials"
+    )
+    with urllib.request.urlopen(request) as resp:
+        return json.loads(resp.read())["access_token"]
+
+
+def get(url: str, token: str, headers: dict | None = None):
+    request = urllib.request.Request(
+        url, headers={"Authorization": f"Bearer {token}", **(headers or {})}
+    )
+    return urllib.request.urlopen(request)
+
+
+def test_serves_recorded_extracts(stand_in):
+    token = get_token(stand_in.base_url)
+    for path in ["publication/epodoc/EP3661357", "application/epodoc/EP18752141"]:
+        with get(
+            f"{stand_in.base_url}/rest-services/register/{path}/biblio", token
+        ) as resp:
+            extract = json.loads(resp.read())
+            assert "idle" in resp.headers["X-Throttling-Control"]
+        document = extract["ops:world-patent-data"]["ops:register-search"][
+            "reg:register-documents"
+        ]["reg:register-document"]
+        assert document["reg:bibliographic-data"]["@id"] == "EP18752141P"
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(
+            f"{stand_in.base_url}/rest-services/register/application/epodoc/EP31650114/biblio",
+            token,
+        )
+    assert error.value.code == 404
+    assert stand_in.requests_served == 3
+
+
+def test_serves_every_document_of_a_multi_document_extract():
+    extract = load_recorded_extract("output_files/test_register_extract.json")
+    first = get_register_document(extract)
+    second = copy.deepcopy(first)
+    biblio = second["reg:bibliographic-data"]
+    for section in ("reg:application-reference", "reg:publication-reference"):
+        for reference in as_list(biblio[section]):
+            number = reference["reg:document-id"]["reg:doc-number"]
+            number["$"] = "9" + number["$"][1:]
+    extract["ops:world-patent-data"]["ops:register-search"]["reg:register-documents"][
+        "reg:register-document"
+    ] = [first, second]
+    with OPSStandIn(extract_paths=[]) as stand_in:
+        stand_in.add_extract(extract)
+        token = get_token(stand_in.base_url)
+        for document in (first, second):
+            number = min(document_numbers(document))
+            with get(
+                f"{stand_in.base_url}/rest-services/register/application/epodoc/{number}/biblio",
+                token,
+            ) as resp:
+                served = json.loads(resp.read())
+            assert document_numbers(get_register_document(served)) == document_numbers(
+                document
+            )
+
+
+def test_rejects_unknown_token(stand_in):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(
+            f"{stand_in.base_url}/rest-services/register/publication/epodoc/EP3661357/biblio",
+            "bad",
+        )
+    assert error.value.code == 401
+
+
+def test_search_batches_numbers(stand_in):
+    token = get_token(stand_in.base_url)
+    query = urllib.parse.quote("pn=EP3661357 or pn=EP3401400 or ap=EP31650114")
+    with get(
+        f"{stand_in.base_url}/rest-services/register/search?q={query}",
+        token,
+        {"Range": "1-10"},
+    ) as resp:
+        search = json.loads(resp.read())["ops:world-patent-data"]["ops:register-search"]
+    assert search["@total-result-count"] == "2"
+    assert len(search["reg:register-documents"]["reg:register-document"]) == 2
+
+
+def test_throttled_responses():
+    config = StandInConfig(throttle_rate=1.0, system_state="overloaded")
+    with OPSStandIn(config=config) as stand_in:
+        token = get_token(stand_in.base_url)
+        with pytest.raises(urllib.error.HTTPError) as error:
+            get(
+                f"{stand_in.base_url}/rest-services/register/publication/epodoc/EP3661357/biblio",
+                token,
+            )
+    assert error.value.code == 403
+    assert "other=black" in error.value.headers["X-Throttling-Control"]
+    assert error.value.headers["X-Throttling-Control"].startswith("overloaded")
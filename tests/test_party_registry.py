@@ -0,0 +1,61 @@
+import threading
+from helpers.party_registry import PartyRegistry
+from helpers.register_parser_functions import Party, get_one_inventor
+
+
+def inventor_data(name, sequence="1"):
+    return {
+        "@sequence": sequence,
+        "reg:addressbook": {
+            "reg:name": {"$": name},
+            "reg:address": {
+                "reg:address-1": {"$": "1 Main Street"},
+                "reg:country": {"$": "IE"},
+            },
+        },
+    }
+
+
+def test_registry_returns_existing_party():
+    registry = PartyRegistry()
+    first = registry.register(Party(company_name="ACME"))
+    second = registry.register(Party(company_name="ACME"))
+    other = registry.register(Party(company_name="ACME", address_country="DE"))
+    assert second is first
+    assert other is not first
+    assert len(registry) == 2
+
+
+def test_registry_evicts_least_recently_seen():
+    registry = PartyRegistry(max_parties=2)
+    acme = registry.register(Party(company_name="ACME"))
+    registry.register(Party(company_name="Widgets"))
+    registry.register(Party(company_name="ACME"))  # ACME is now the most recent
+    registry.register(Party(company_name="Gadgets"))
+    assert {party.company_name for party in registry.parties()} == {"ACME", "Gadgets"}
+    assert registry.register(Party(company_name="ACME")) is acme
+
+
+def test_registries_are_scoped_per_job():
+    first_job, second_job = PartyRegistry(), PartyRegistry()
+    in_first = get_one_inventor(inventor_data("DOE, Jane"), first_job)
+    assert get_one_inventor(inventor_data("DOE, Jane"), first_job) is in_first
+    assert get_one_inventor(inventor_data("DOE, Jane"), second_job) is not in_first
+
+
+def test_registry_is_thread_safe():
+    registry = PartyRegistry()
+    found = []
+
+    def register_all():
+        found.extend(
+            registry.register(Party(company_name=f"Company {n}")) for n in range(500)
+        )
+
+    threads = [threading.Thread(target=register_all) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(registry) == 500
+    assert len({id(party) for party in found}) == 500
@@ -0,0 +1,106 @@
+import json
+from pathlib import Path
+import pytest
+from openpyxl import load_workbook
+from helpers.ops_stand_in import load_recorded_extract
+from helpers.party_registry import PartyRegistry
+from helpers.register_parser_functions import (
+    LazyPatent,
+    Party,
+    Patent,
+    extract_patent,
+    split_register_document,
+)
+from helpers.sharded_export import export_sharded, plain_patent, shard_patents
+
+
+def make_patents(refs):
+    return [
+        Patent(
+            ref=ref,
+            ep_application_number=f"1875214{n}.4",
+            priority=[],
+            applicants=[Party(company_name="ACME")],
+            inventors=[],
+            designated_states=["DE"],
+        )
+        for n, ref in enumerate(refs)
+    ]
+
+
+def test_shard_patents_by_row_count_and_ref_prefix():
+    patents = make_patents(["ML-1", "ML-2", "KT-1", "ML-3", "KT-2"])
+    by_rows = shard_patents(patents, shards=2)
+    assert list(by_rows) == ["part01", "part02"]
+    assert [p.ref for p in by_rows["part01"]] == ["ML-1", "ML-2", "KT-1"]
+    assert [p.ref for p in by_rows["part02"]] == ["ML-3", "KT-2"]
+    by_prefix = shard_patents(patents, ref_prefix_length=2)
+    assert {shard: len(cases) for shard, cases in by_prefix.items()} == {
+        "ML": 3,
+        "KT": 2,
+    }
+    assert list(shard_patents(patents[:1], shards=4)) == ["part01"]
+    with pytest.raises(ValueError):
+        shard_patents(patents)
+    with pytest.raises(ValueError):
+        shard_patents(patents, ref_prefix_length=0)
+
+
+def test_prefix_shard_names_are_safe_file_names(tmp_path):
+    patents = make_patents(["../x/1", "C:\\ref", "ML/01", ""])
+    assert list(shard_patents(patents, ref_prefix_length=5)) == [
+        "_x_",
+        "C__re",
+        "ML_01",
+        "no_ref",
+    ]
+    files = export_sharded(
+        patents, tmp_path / "Patricia_import.xlsx", ref_prefix_length=5
+    )
+    assert all(Path(file.path).parent == tmp_path for file in files)
+
+
+def test_prefix_shards_differing_only_in_case_are_merged():
+    patents = make_patents(["ab-1", "AB-2", "Ab-3", "KT-1"])
+    by_prefix = shard_patents(patents, ref_prefix_length=2)
+    assert {shard: [p.ref for p in cases] for shard, cases in by_prefix.items()} == {
+        "ab": ["ab-1", "AB-2", "Ab-3"],
+        "KT": ["KT-1"],
+    }
+
+
+def test_plain_patent_parses_lazy_patent():
+    biblio = split_register_document(
+        load_recorded_extract("output_files/test_register_extract.json")
+    ).biblio
+    plain = plain_patent(LazyPatent(biblio, "ref1", PartyRegistry()))
+    assert type(plain) is Patent
+    eager = extract_patent(biblio)
+    assert (plain.ref, plain.grant_date, plain.applicants) == (
+        "ref1",
+        eager.grant_date,
+        eager.applicants,
+    )
+
+
+def test_export_sharded_writes_workbooks_and_manifest(tmp_path):
+    output_path = tmp_path / "Patricia_import.xlsx"
+    files = export_sharded(
+        make_patents([f"ref{n}" for n in range(5)]),
+        output_path,
+        shards=2,
+        max_workers=2,
+    )
+    assert [(file.shard, file.cases) for file in files] == [
+        ("part01", 3),
+        ("part02", 2),
+    ]
+    manifest = json.loads((tmp_path / "Patricia_import.xlsx.manifest.json").read_text())
+    assert manifest["cases"] == 5
+    assert [entry["path"] for entry in manifest["files"]] == [
+        str(tmp_path / "Patricia_import_part01.xlsx"),
+        str(tmp_path / "Patricia_import_part02.xlsx"),
+    ]
+    sheet = load_workbook(files[1].path)["CASE_DATA"]
+    assert [sheet[f"A{row}"].value for row in (2, 3)] == ["ref3", "ref4"]
+    assert files[1].first_ref == "ref3"